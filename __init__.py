@@ -18,6 +18,7 @@ bl_info = {
 glTF2ExportUserExtension = behavior_graph.glTF2ExportUserExtension
 glTF2_pre_export_callback = behavior_graph.glTF2_pre_export_callback
 glTF2_post_export_callback = behavior_graph.glTF2_post_export_callback
+draw_export = ui.draw_export
 
 
 class BGGlobalProps(PropertyGroup):
@@ -29,10 +30,31 @@ class BGGlobalProps(PropertyGroup):
 
 @persistent
 def load_post(dummy):
+    from .utils import invalidate_link_maps
+    invalidate_link_maps()
+    # The message bus subscriptions are cleared when loading a file
+    from .export_cache import clear_export_cache, subscribe_to_tables
+    clear_export_cache()
+    subscribe_to_tables()
     from .migrations import migrate
     migrate()
 
 
+@persistent
+def undo_redo_post(dummy):
+    # Undo can free the links that are referenced by the cached link maps
+    from .utils import invalidate_link_maps
+    invalidate_link_maps()
+    from .export_cache import clear_export_cache
+    clear_export_cache()
+
+
+@persistent
+def depsgraph_update_post(scene, depsgraph):
+    from .export_cache import depsgraph_update
+    depsgraph_update(depsgraph)
+
+
 @persistent
 def save_post(dummy):
     for scene in bpy.data.scenes:
@@ -59,6 +81,17 @@ def register():
     if load_post not in bpy.app.handlers.save_post:
         bpy.app.handlers.save_post.append(save_post)
 
+    if undo_redo_post not in bpy.app.handlers.undo_post:
+        bpy.app.handlers.undo_post.append(undo_redo_post)
+
+    if undo_redo_post not in bpy.app.handlers.redo_post:
+        bpy.app.handlers.redo_post.append(undo_redo_post)
+
+    if depsgraph_update_post not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_post)
+
+    from .export_cache import subscribe_to_tables
+    subscribe_to_tables()
 
 
 def unregister():
@@ -77,6 +110,19 @@ def unregister():
     if load_post in bpy.app.handlers.save_post:
         bpy.app.handlers.save_post.remove(save_post)
 
+    if undo_redo_post in bpy.app.handlers.undo_post:
+        bpy.app.handlers.undo_post.remove(undo_redo_post)
+
+    if undo_redo_post in bpy.app.handlers.redo_post:
+        bpy.app.handlers.redo_post.remove(undo_redo_post)
+
+    if depsgraph_update_post in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(depsgraph_update_post)
+
+    from .export_cache import unsubscribe_from_tables, clear_export_cache
+    unsubscribe_from_tables()
+    clear_export_cache()
+
 
 if __name__ == "__main__":
     register()
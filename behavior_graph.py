@@ -7,9 +7,18 @@ from bpy.types import Node, NodeTree, NodeReroute, NodeSocketString
 from bpy.utils import register_class, unregister_class
 from nodeitems_utils import NodeCategory, NodeItem, register_node_categories, unregister_node_categories
 from io_hubs_addon.io.utils import gather_property
-from .utils import gather_socket_value, type_to_socket, resolve_input_link, resolve_output_link, gather_variable_value, get_prefs
+from .utils import type_to_socket, gather_variable_value, get_prefs, build_vnode_index, clear_export_caches, invalidate_link_maps, begin_link_maps, end_link_maps, exporting_owner, begin_network_plan, apply_network_plan, add_embedded_buffer_view
 from .consts import CUSTOM_CATEGORY_NODES, DEPRECATED_NODES, CATEGORY_COLORS, FILTERED_CATEGORIES
 from .sockets import *
+from .graph_ir import get_graph_ir, PARAM_LINK, PARAM_SOCKET, PARAM_NODE
+from .templates import extract_graph_templates
+from .serialization import compact_node_ids, minify_behavior, iter_graph_nodes, split_graph_instances, get_referenced_ids, index_entities
+from .binary_encoding import encode_behavior
+from .execution_plan import get_execution_plan, rename_execution_plan
+from .event_dispatch import get_event_dispatch, rename_event_dispatch
+from .network_analysis import get_network_decisions, disable_networking
+from .optimizations import eliminate_dead_nodes, fold_constants, merge_common_subexpressions, remove_redundant_casts
+from .export_cache import begin_cached_export, end_cached_export, get_cached_instance, store_cached_instance, mark_dirty, get_content_hash
 
 auto_casts = {
     ("BGHubsEntitySocket", "NodeSocketString"): "BGNode_hubs_entity_toString",
@@ -97,6 +106,9 @@ class BGTree(NodeTree):
                 else:
                     self.links.remove(link)
 
+        invalidate_link_maps(self)
+        mark_dirty(self)
+
 
 class BGCategory(NodeCategory):
     @classmethod
@@ -400,6 +412,9 @@ all_classes = [
 
 extra_classes = []
 
+# Nodespec entries by node type
+node_specs = {}
+
 # Nodes that we don't want to load from the spec because we want to use the hardcoded one
 HARDCODED_NODES = {
     node.node_type for node in all_classes + extra_classes if hasattr(node, "node_type")
@@ -476,6 +491,7 @@ def read_nodespec(filename):
         nodes = json.load(file)
         nodes.sort(key=lambda item: item["label"])
         for node_spec in nodes:
+            node_specs[node_spec["type"]] = node_spec
             if node_spec["type"] in HARDCODED_NODES:
                 print("SKIP", node_spec["type"])
                 continue
@@ -517,104 +533,216 @@ def get_object_custom_events(ob, events, export_settings):
                 })
 
 
-def gather_events_and_variables(export_settings):
+def gather_events_and_variables(owners, export_settings):
+    # Only the owners visited by the exporter and the graphs in their slots are gathered, so selection, visible
+    # and active collection only exports don't pay for the rest of the file
     events = {}
     variables = {}
 
-    # Graph variables
-    for graph in bpy.data.node_groups:
-        get_object_variables(graph, variables, export_settings)
+    # The exporter can visit the same owner more than once (ie. objects in several scenes or collection instances)
+    owners = list(dict.fromkeys(owners))
+    graphs = {slot.graph for owner in owners for slot in owner.bg_slots if slot.graph}
+    scopes = [graph for graph in bpy.data.node_groups if graph in graphs]
+    scopes += [owner for owner in owners if type(owner) is bpy.types.Scene]
+    scopes += [owner for owner in owners if type(owner) is not bpy.types.Scene]
 
-    # Scene variables
-    get_object_variables(bpy.context.scene, variables, export_settings)
-
-    # Object variables
-    for ob in bpy.context.view_layer.objects:
+    # Graph, scene and object variables
+    for ob in scopes:
         get_object_variables(ob, variables, export_settings)
 
-    # Graph Custom Events
-    for graph in bpy.data.node_groups:
-        get_object_custom_events(graph, events, export_settings)
-
-    # Scene Custom Events
-    get_object_custom_events(bpy.context.scene, events, export_settings)
-
-    # Object Custom Events
-    for ob in bpy.context.view_layer.objects:
+    # Graph, scene and object custom events
+    for ob in scopes:
         get_object_custom_events(ob, events, export_settings)
 
     return (events, variables)
 
 
+def get_event_node_types():
+    event_node_types = {node_type for node_type, node_spec in node_specs.items() if node_spec["category"] == "Event"}
+    event_node_types.update(cls.node_type for cls in all_classes if issubclass(cls, BGEventNode))
+    return event_node_types
+
+
+def get_hardcoded_node_classes():
+    return [cls for cls in all_classes if hasattr(cls, "node_type")]
+
+
+def get_spec_data_node_types():
+    # Spec nodes without flow sockets. Hardcoded nodes don't use the spec sockets so they are left out.
+    data_node_types = set()
+    for node_type, node_spec in node_specs.items():
+        sockets = node_spec["inputs"] + node_spec["outputs"]
+        if (node_type not in HARDCODED_NODES and node_spec["category"] != "Event" and
+                not any(socket["valueType"] == "flow" for socket in sockets)):
+            data_node_types.add(node_type)
+    return data_node_types
+
+
+def get_data_node_types():
+    # Nodes without flow sockets, they are evaluated by the client every time one of their outputs is read
+    data_node_types = get_spec_data_node_types()
+    data_node_types.update(cls.node_type for cls in get_hardcoded_node_classes() if not cls.flow_node)
+    return data_node_types
+
+
+def get_pure_node_types():
+    # Hardcoded data nodes read variables and entity state, so only spec nodes can be merged
+    pure_node_types = get_spec_data_node_types()
+    pure_node_types.discard("math/random/float")
+    return pure_node_types
+
+
+def get_constant_node_types():
+    # Pure nodes that only compute their outputs from their inputs, without reading entity or client state
+    return {node_type for node_type in get_pure_node_types()
+            if node_type.startswith("math/") or node_type.startswith("logic/")}
+
+
+def get_flow_node_types():
+    flow_node_types = (set(node_specs.keys()) - get_data_node_types()) | get_event_node_types()
+    flow_node_types.update(cls.node_type for cls in get_hardcoded_node_classes() if cls.flow_node)
+    return flow_node_types
+
+
+def optimize_graph_instance(graph_instance, export_props, export_report):
+    nodes = graph_instance["nodes"]
+    prefix = graph_instance["prefix"]
+
+    def report(message, changed):
+        if changed:
+            names = ", ".join(node_data["id"][len(prefix) + 1:] for node_data in changed)
+            export_report.append(
+                f'INFO: {graph_instance["owner"].name}/{graph_instance["graph"].name}: {message}: {names}')
+
+    if export_props.fold_constants:
+        nodes, folded = fold_constants(nodes, node_specs)
+        report("Folded constant nodes", folded)
+    if export_props.remove_redundant_casts:
+        nodes, casts = remove_redundant_casts(nodes)
+        report("Removed redundant conversion nodes", casts)
+    if export_props.merge_duplicate_nodes:
+        nodes, merged = merge_common_subexpressions(nodes, get_pure_node_types())
+        report("Merged duplicate nodes", merged)
+    if export_props.remove_unreachable_nodes:
+        nodes, removed = eliminate_dead_nodes(nodes, get_event_node_types())
+        report("Removed unreachable nodes", removed)
+    graph_instance["nodes"] = nodes
+
+
+def prune_events_and_variables(customEvents, variables, graph_instances, export_report):
+    # Variables and events keep their ids so the references in the gathered (and cached) nodes stay valid
+    variable_ids = get_referenced_ids(graph_instances, [], [], "variableId")
+    event_ids = get_referenced_ids(graph_instances, [], [], "customEventId")
+    unused_variables = [var["name"] for var in variables if var["id"] not in variable_ids]
+    unused_events = [event["name"] for event in customEvents if event["id"] not in event_ids]
+    if unused_variables:
+        export_report.append(f'INFO: Removed unused variables: {", ".join(unused_variables)}')
+    if unused_events:
+        export_report.append(f'INFO: Removed unused custom events: {", ".join(unused_events)}')
+    return ([event for event in customEvents if event["id"] in event_ids],
+            [var for var in variables if var["id"] in variable_ids])
+
+
+def minimize_network_plan(graph_instances, export_settings, export_report):
+    # Returns the network dependencies that don't need to be applied
+    network_plan = export_settings['bg_network_plan']
+    nodes = [node_data for graph_instance in graph_instances for node_data in graph_instance["nodes"]]
+    skipped = set()
+    local_node_ids = set()
+    for target, dep, networked, reason in get_network_decisions(nodes, network_plan, get_constant_node_types()):
+        if networked:
+            export_report.append(f'INFO: {target.name}: Networking {dep.get_name()}, {reason}')
+        else:
+            skipped.add((target, dep))
+            local_node_ids.update(network_plan[(target, dep)]["sources"])
+            export_report.append(f'INFO: {target.name}: Not networking {dep.get_name()}, {reason}')
+    if local_node_ids:
+        for graph_instance in graph_instances:
+            graph_instance["nodes"] = disable_networking(graph_instance["nodes"], local_node_ids)
+    return skipped
+
+
+def plan_graph_instance(graph_instance, export_report):
+    plan, cyclic = get_execution_plan(graph_instance["nodes"], get_data_node_types(), get_flow_node_types())
+    if cyclic:
+        prefix = graph_instance["prefix"]
+        names = ", ".join(sorted(node_id[len(prefix) + 1:] for node_id in cyclic))
+        export_report.append(
+            f'ERROR: {graph_instance["owner"].name}/{graph_instance["graph"].name}: Data dependency cycle between nodes: {names}')
+    graph_instance["executionPlan"] = plan
+
+
+def get_instance_prefix(ob, ob_idx, slot, slot_idx):
+    return f"{ob.name}_{ob_idx}_{slot.graph.name}_{slot_idx}"
+
+
 def gather_nodes(ob, ob_idx, slot, slot_idx, export_settings, events, variables, export_report):
-    from .nodes import BGNode
+    graph_ir = get_graph_ir(slot.graph, export_settings)
 
     nodes = []
 
-    for node in slot.graph.nodes:
+    for ir_node in graph_ir.nodes:
         try:
-            if not isinstance(node, BGNode):
-                continue
-
-            node_name = node.name if not node.label else node.label
+            node_name = ir_node.name if not ir_node.label else ir_node.label
             print(f'Gathering {ob.name}-{slot.graph.name}-{node_name}')
 
-            prefix = f"{ob.name}_{ob_idx}_{slot.graph.name}_{slot_idx}"
+            if ir_node.error:
+                raise Exception(ir_node.error)
+
+            prefix = get_instance_prefix(ob, ob_idx, slot, slot_idx)
             node_data = {
-                "id": f"{prefix}_{node.name}",
-                "type": node.node_type,
+                "id": f"{prefix}_{ir_node.name}",
+                "type": ir_node.node_type,
                 "parameters": {},
                 "configuration": {},
                 "flows": {}
             }
 
-            for output_socket in node.outputs:
-                if isinstance(output_socket, BGFlowSocket) and output_socket.is_linked:
-                    link = resolve_output_link(output_socket)
-                    node_data["flows"][output_socket.identifier] = {
-                        "nodeId": f"{prefix}_{link.to_node.name}",
-                        "socket": link.to_socket.identifier
-                    }
+            for identifier, link in ir_node.flows.items():
+                node_data["flows"][identifier] = {
+                    "nodeId": f"{prefix}_{link.node}",
+                    "socket": link.socket
+                }
 
-            for input_socket in node.inputs:
-                export = True if not hasattr(input_socket, "export") else input_socket.export
-                if input_socket.is_linked and not input_socket.hide and export:
-                    link = resolve_input_link(input_socket)
-                    node_data["parameters"][input_socket.identifier] = {
+            for ir_input in ir_node.inputs:
+                if ir_input.mode == PARAM_LINK:
+                    node_data["parameters"][ir_input.identifier] = {
                         "link": {
-                            "nodeId": f"{prefix}_{link.from_node.name}",
-                            "socket": link.from_socket.identifier
+                            "nodeId": f"{prefix}_{ir_input.link.node}",
+                            "socket": ir_input.link.socket
                         }
                     }
 
-                elif hasattr(input_socket, "gather_parameters") and callable(getattr(input_socket, "gather_parameters")):
-                    parameters = input_socket.gather_parameters(ob, export_settings)
+                elif ir_input.mode == PARAM_SOCKET:
+                    parameters = ir_input.bl_socket.gather_parameters(ob, export_settings)
                     if parameters is not None:
-                        node_data["parameters"].update({input_socket.identifier: parameters})
+                        node_data["parameters"].update({ir_input.identifier: parameters})
 
-                elif hasattr(node, "gather_parameters") and callable(getattr(node, "gather_parameters")):
-                    parameters = node.gather_parameters(ob, input_socket, export_settings)
+                elif ir_input.mode == PARAM_NODE:
+                    parameters = ir_node.bl_node.gather_parameters(ob, ir_input.bl_socket, export_settings)
                     if parameters is not None:
-                        node_data["parameters"].update({input_socket.identifier: parameters})
+                        node_data["parameters"].update({ir_input.identifier: parameters})
 
-                else:
-                    value = gather_socket_value(ob, export_settings, input_socket)
-                    if value is not None:
-                        node_data["parameters"].update({input_socket.identifier: {"value": value}})
+                elif ir_input.value is not None:
+                    node_data["parameters"].update({ir_input.identifier: {"value": ir_input.value}})
 
-            if hasattr(node, "gather_configuration") and callable(getattr(node, "gather_configuration")):
-                configuration = node.gather_configuration(ob, variables, events, export_settings)
+            if ir_node.gathers_configuration:
+                configuration = ir_node.bl_node.gather_configuration(ob, variables, events, export_settings)
                 if configuration is not None:
                     node_data["configuration"] = configuration
+            elif ir_node.configuration_keys:
+                for key in ir_node.configuration_keys:
+                    node_data["configuration"][key] = gather_property(
+                        export_settings, ir_node.bl_node, ir_node.bl_node, key)
+            else:
+                node_data["configuration"].update(ir_node.configuration)
 
-            elif hasattr(node, "__annotations__"):
-                for key in node.__annotations__.keys():
-                    if not node.is_property_hidden(key):
-                        node_data["configuration"][key] = gather_property(
-                            export_settings, node, node, key)
-
-            if hasattr(node, "update_network_dependencies") and callable(getattr(node, "update_network_dependencies")):
-                node.update_network_dependencies(ob, export_settings)
+            if ir_node.updates_network_dependencies:
+                export_settings['bg_network_source'] = node_data["id"]
+                try:
+                    ir_node.bl_node.update_network_dependencies(ob, export_settings)
+                finally:
+                    del export_settings['bg_network_source']
 
             nodes.append(node_data)
 
@@ -624,6 +752,66 @@ def gather_nodes(ob, ob_idx, slot, slot_idx, export_settings, events, variables,
     return nodes
 
 
+def build_behavior(customEvents, variables, graph_instances, templates, instances, export_settings, export_props):
+    # Returns the behavior dictionary and its binary data when using the binary encoding, or None for empty behaviors
+    node_ids = [node_data["id"] for graph_instance in graph_instances for node_data in graph_instance["nodes"]]
+    if not node_ids and not templates:
+        return (None, None)
+
+    # The behavior nodes are streamed from the graph instances through the output transforms and the graph instances
+    # give up their nodes as they are written, so everything that reads them has to run before the final list
+    # is built. The graph instances can't be used afterwards.
+    behavior = {
+        "customEvents": customEvents,
+        "variables": variables,
+        "nodes": iter_graph_nodes(graph_instances),
+        "metadata": {
+            "gltf_yup": export_settings['gltf_yup']
+        }
+    }
+    if templates:
+        behavior["templates"] = templates
+        behavior["instances"] = instances
+    if export_props.export_execution_plan:
+        plan = [entry for graph_instance in graph_instances for entry in graph_instance["executionPlan"]]
+    if export_props.export_event_dispatch:
+        dispatch = get_event_dispatch(
+            (node_data for graph_instance in graph_instances for node_data in graph_instance["nodes"]),
+            get_event_node_types())
+    # Split behaviors are hashed, their node names depend on the owner position in the scene
+    if export_props.compact_node_ids or export_props.split_behaviors:
+        behavior = compact_node_ids(behavior, export_props.keep_debug_names, node_ids)
+        node_indices = {node_id: idx for idx, node_id in enumerate(node_ids)}
+        if export_props.export_execution_plan:
+            plan = rename_execution_plan(plan, node_indices)
+        if export_props.export_event_dispatch:
+            dispatch = rename_event_dispatch(dispatch, node_indices)
+        node_ids = list(range(len(node_ids)))
+    if export_props.export_event_dispatch:
+        if dispatch:
+            behavior["eventDispatch"] = dispatch
+        if templates:
+            behavior["templates"] = [dict(template, eventDispatch=get_event_dispatch(template["nodes"], get_event_node_types()))
+                                     for template in behavior["templates"]]
+    if export_props.export_execution_plan:
+        if plan:
+            behavior["executionPlan"] = plan
+        if templates:
+            # Template plans are computed from the final template nodes, their cycles were reported by the instances
+            behavior["templates"] = [
+                dict(template, executionPlan=get_execution_plan(
+                    template["nodes"], get_data_node_types(), get_flow_node_types())[0])
+                for template in behavior["templates"]]
+    if export_props.export_profile == 'MINIFIED':
+        behavior = minify_behavior(behavior, node_specs)
+    if export_props.use_entity_table:
+        behavior = index_entities(behavior)
+    if export_props.use_binary_encoding:
+        return encode_behavior(behavior, node_ids)
+    behavior["nodes"] = list(behavior["nodes"])
+    return (behavior, None)
+
+
 class glTF2ExportUserExtension:
     def __init__(self):
         # We need to wait until we create the gltf2UserExtension to import the gltf2 modules
@@ -644,13 +832,16 @@ class glTF2ExportUserExtension:
 
         export_report = []
 
+        if bpy.app.version >= (3, 2, 0):
+            build_vnode_index(export_settings)
+
         # This is a hack to allow multi-graph while we have proper per gltf node graph support
         slots = []
         for idx, ob in enumerate(self.nodes):
             slots.append({"ob": ob, "idx": idx, "slots": list(ob.bg_slots)})
 
         try:
-            glob_events, glob_variables = gather_events_and_variables(export_settings)
+            glob_events, glob_variables = gather_events_and_variables(self.nodes, export_settings)
 
             variables = []
             customEvents = []
@@ -659,7 +850,13 @@ class glTF2ExportUserExtension:
             for event in glob_events:
                 customEvents.append(glob_events[event])
 
-            nodes = []
+            export_props = bpy.context.scene.bg_export_props
+            use_cache = export_props.use_export_cache or export_props.use_disk_cache
+            if use_cache:
+                begin_cached_export(export_settings, glob_events, glob_variables, export_props)
+
+            begin_network_plan(export_settings)
+            graph_instances = []
             for item in slots:
                 ob = item["ob"]
                 ob_idx = item["idx"]
@@ -667,38 +864,85 @@ class glTF2ExportUserExtension:
                 for slot in slots:
                     if slot is not None:
                         slot_idx = slots.index(slot)
-                        # If we don't select and activate the object, the node properties
-                        # that reference cached enums are empty sometimes. Very strange but for now
-                        #  this works.
-                        if type(ob) is not bpy.types.Scene:
-                            was_selected = ob in bpy.context.selected_objects
-                            previous_active_ob = bpy.context.active_object
-                            ob.select_set(True)
-                            bpy.context.view_layer.objects.active = ob
-
-                        bpy.context.scene.bg_export_type = "object" if type(ob) is bpy.types.Object else "scene"
-                        nodes.extend(gather_nodes(ob, ob_idx, slot, slot_idx, export_settings,
-                                                  glob_events, glob_variables, export_report))
-                        bpy.context.scene.bg_export_type = "none"
-
-                        if type(ob) is not bpy.types.Scene:
-                            ob.select_set(was_selected)
-                            bpy.context.view_layer.objects.active = previous_active_ob
-
-            if nodes:
+                        # Node properties that reference cached enums resolve their entities through
+                        # the exporting owner so we don't need to select and activate the object.
+                        with exporting_owner(ob, slot.graph):
+                            prefix = get_instance_prefix(ob, ob_idx, slot, slot_idx)
+                            nodes = None
+                            if use_cache:
+                                nodes = get_cached_instance(ob, slot.graph, slot_idx, prefix, export_settings)
+                            if nodes is None:
+                                report_size = len(export_report)
+                                network_log = export_settings['bg_network_log'] = []
+                                try:
+                                    nodes = gather_nodes(ob, ob_idx, slot, slot_idx, export_settings,
+                                                         glob_events, glob_variables, export_report)
+                                finally:
+                                    del export_settings['bg_network_log']
+                                # Instances with errors are gathered again so the errors are always reported
+                                if use_cache and len(export_report) == report_size:
+                                    store_cached_instance(ob, slot.graph, slot_idx, prefix, nodes, network_log,
+                                                          export_settings)
+                            graph_instances.append({
+                                "owner": ob,
+                                "graph": slot.graph,
+                                "prefix": prefix,
+                                "nodes": nodes
+                            })
+
+            if use_cache:
+                end_cached_export(export_settings, export_report)
+
+            for graph_instance in graph_instances:
+                optimize_graph_instance(graph_instance, export_props, export_report)
+                if export_props.export_execution_plan:
+                    plan_graph_instance(graph_instance, export_report)
+
+            if export_props.remove_unused_variables:
+                customEvents, variables = prune_events_and_variables(customEvents, variables, graph_instances,
+                                                                     export_report)
+
+            # Networking is decided on the optimized nodes, nodes removed as unreachable keep their targets networked
+            skipped = set()
+            if export_props.minimize_networking:
+                skipped = minimize_network_plan(graph_instances, export_settings, export_report)
+            apply_network_plan(export_settings, export_report, skipped)
+
+            templates = []
+            instances = []
+            if export_props.use_graph_templates:
+                graph_instances, templates, instances = extract_graph_templates(graph_instances, export_settings)
+
+            behaviors = []
+            if export_props.split_behaviors:
+                for part_instances, part_templates, part_instance_table in split_graph_instances(
+                        graph_instances, templates, instances):
+                    variable_ids = get_referenced_ids(part_instances, part_templates, part_instance_table, "variableId")
+                    event_ids = get_referenced_ids(part_instances, part_templates, part_instance_table, "customEventId")
+                    behavior, data = build_behavior(
+                        [event for event in customEvents if event["id"] in event_ids],
+                        [var for var in variables if var["id"] in variable_ids],
+                        part_instances, part_templates, part_instance_table, export_settings, export_props)
+                    if behavior:
+                        behavior["hash"] = get_content_hash(behavior, data, export_settings)
+                        behaviors.append((behavior, data))
+            else:
+                behavior, data = build_behavior(customEvents, variables, graph_instances, templates, instances,
+                                                export_settings, export_props)
+                if behavior:
+                    behaviors.append((behavior, data))
+
+            for behavior, data in behaviors:
+                if data is not None:
+                    behavior["bufferView"] = add_embedded_buffer_view(gltf2_object, data)
+
+            if behaviors:
                 if gltf2_object.extensions is None:
                     gltf2_object.extensions = {}
                 gltf2_object.extensions["MOZ_behavior"] = self.Extension(
                     name="MOZ_behavior",
                     extension={
-                        "behaviors": [{
-                            "customEvents": customEvents,
-                            "variables": variables,
-                            "nodes": nodes,
-                            "metadata": {
-                                "gltf_yup": export_settings['gltf_yup']
-                            }
-                        }]
+                        "behaviors": [behavior for behavior, data in behaviors]
                     },
                     required=False
                 )
@@ -719,10 +963,8 @@ def get_category(category, items):
     return BGCategory("BEHAVIOR_GRAPH_" + category.replace(" ", "_"), category, items=cat_items)
 
 
-# We need to make sure that the bg_export_type property is reset to none after
-# exporting, otherwise filter_entity_type will always return the wrong items :S
 def glTF2_pre_export_callback(export_settings):
-    bpy.context.scene.bg_export_type = "none"
+    begin_link_maps()
     import io_hubs_addon
     exts = export_settings["gltf_user_extensions"]
     for ext in exts:
@@ -731,18 +973,11 @@ def glTF2_pre_export_callback(export_settings):
 
 
 def glTF2_post_export_callback(export_settings):
-    bpy.context.scene.bg_export_type = "none"
+    end_link_maps()
+    clear_export_caches(export_settings)
 
 
 def register():
-    # This property is used to keep track of the current exported object types. See filter_entity_type for more info.
-    bpy.types.Scene.bg_export_type = bpy.props.EnumProperty(
-        name="Object Export Type",
-        description="Type of the object that is currently being exported",
-        items=[("none", "None", "None"), ("object", "Object", "Object"), ("scene", "Scene", "Scene")],
-        options={'HIDDEN'},
-        default="none")
-
     behavior_graph_node_categories.update(CUSTOM_CATEGORIES)
 
     read_nodespec(os.path.join(os.path.dirname(
@@ -773,8 +1008,7 @@ def unregister():
 
     behavior_graph_node_categories.clear()
     extra_classes.clear()
-
-    del bpy.types.Scene.bg_export_type
+    node_specs.clear()
 
 
 if __name__ == "__main__":
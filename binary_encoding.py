@@ -0,0 +1,212 @@
+import struct
+
+# Binary encoding of the behavior node tables. Node types, links, flows and numeric literals are written as
+# little endian typed arrays to a glTF buffer view, everything else (strings, entities, materials, configuration)
+# stays in the JSON header as "irregular" node data. Nodes are identified by their position in the table.
+#
+# Each node table starts at header["byteOffset"] (a multiple of 8) and contains, in this order:
+#   uint32[count]          node type (string table index)
+#   uint32[links * 4]      node, input (string), source node, source output (string)
+#   uint32[flows * 4]      node, output (string), target node, target input (string)
+#   uint32[numbers * 3]    node, input (string), kind (0 float, 1 integer, 2 boolean)
+#   uint32[vectors * 2]    node, input (string)
+#   padding to a multiple of 8 bytes
+#   float64[numbers]       number values
+#   float64[vectors * 3]   vec3 values (x, y, z)
+
+ENCODING_NAME = "MOZ_behavior_binary"
+ENCODING_VERSION = 1
+
+KIND_FLOAT = 0
+KIND_INTEGER = 1
+KIND_BOOLEAN = 2
+
+MAX_SAFE_INTEGER = 2 ** 53
+
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indices = {}
+
+    def get(self, string):
+        idx = self.indices.get(string)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(string)
+            self.indices[string] = idx
+        return idx
+
+
+def get_number_kind(value):
+    if type(value) is bool:
+        return KIND_BOOLEAN
+    elif type(value) is int and -MAX_SAFE_INTEGER <= value <= MAX_SAFE_INTEGER:
+        return KIND_INTEGER
+    elif type(value) is float:
+        return KIND_FLOAT
+    return None
+
+
+def is_vec3(value):
+    return type(value) is dict and value.keys() == {"x", "y", "z"} and all(
+        type(item) in [int, float] and type(item) is not bool for item in value.values())
+
+
+def encode_node_table(nodes, node_ids, strings, buffer):
+    # nodes can be any iterable, node_ids are the ids of the nodes in order
+    node_indices = {node_id: idx for idx, node_id in enumerate(node_ids)}
+    types = []
+    links = []
+    flows = []
+    number_refs = []
+    number_values = []
+    vector_refs = []
+    vector_values = []
+    irregular = []
+
+    for node_data in nodes:
+        idx = node_indices[node_data["id"]]
+        types.append(strings.get(node_data["type"]))
+        extra = {}
+        for key, parameter in node_data.get("parameters", {}).items():
+            if "link" in parameter and parameter["link"]["nodeId"] in node_indices:
+                links.extend([idx, strings.get(key), node_indices[parameter["link"]["nodeId"]],
+                              strings.get(parameter["link"]["socket"])])
+            elif "value" in parameter and get_number_kind(parameter["value"]) is not None:
+                number_refs.extend([idx, strings.get(key), get_number_kind(parameter["value"])])
+                number_values.append(float(parameter["value"]))
+            elif "value" in parameter and is_vec3(parameter["value"]):
+                vector_refs.extend([idx, strings.get(key)])
+                vector_values.extend([float(parameter["value"][axis]) for axis in ["x", "y", "z"]])
+            else:
+                extra.setdefault("parameters", {})[key] = parameter
+        for key, flow in node_data.get("flows", {}).items():
+            if flow["nodeId"] in node_indices:
+                flows.extend([idx, strings.get(key), node_indices[flow["nodeId"]], strings.get(flow["socket"])])
+            else:
+                extra.setdefault("flows", {})[key] = flow
+        if node_data.get("configuration"):
+            extra["configuration"] = node_data["configuration"]
+        if extra:
+            extra["node"] = idx
+            irregular.append(extra)
+
+    byte_offset = len(buffer)
+    buffer.extend(struct.pack(f"<{len(types)}I", *types))
+    buffer.extend(struct.pack(f"<{len(links)}I", *links))
+    buffer.extend(struct.pack(f"<{len(flows)}I", *flows))
+    buffer.extend(struct.pack(f"<{len(number_refs)}I", *number_refs))
+    buffer.extend(struct.pack(f"<{len(vector_refs)}I", *vector_refs))
+    buffer.extend(bytes(-len(buffer) % 8))
+    buffer.extend(struct.pack(f"<{len(number_values)}d", *number_values))
+    buffer.extend(struct.pack(f"<{len(vector_values)}d", *vector_values))
+
+    header = {
+        "byteOffset": byte_offset,
+        "count": len(node_ids),
+        "links": len(links) // 4,
+        "flows": len(flows) // 4,
+        "numbers": len(number_values),
+        "vectors": len(vector_values) // 3
+    }
+    if any(node_id != idx for idx, node_id in enumerate(node_ids)):
+        header["nodeIds"] = list(node_ids)
+    if irregular:
+        header["irregular"] = irregular
+    return header
+
+
+def encode_behavior(behavior, node_ids):
+    # Returns the behavior with its node tables replaced by headers and the buffer view data
+    strings = StringTable()
+    buffer = bytearray()
+    behavior = dict(behavior)
+    behavior["nodeTable"] = encode_node_table(behavior.pop("nodes"), node_ids, strings, buffer)
+    if "templates" in behavior:
+        templates = []
+        for template in behavior["templates"]:
+            template = dict(template)
+            template_nodes = template.pop("nodes")
+            template["nodeTable"] = encode_node_table(template_nodes, [node_data["id"] for node_data in template_nodes],
+                                                      strings, buffer)
+            templates.append(template)
+        behavior["templates"] = templates
+    behavior["encoding"] = {
+        "name": ENCODING_NAME,
+        "version": ENCODING_VERSION
+    }
+    behavior["strings"] = strings.strings
+    buffer.extend(bytes(-len(buffer) % 4))
+    return (behavior, bytes(buffer))
+
+
+def decode_node_table(header, data, strings):
+    # Reference decoder, returns the node dictionaries of a node table in the regular JSON form
+    offset = header["byteOffset"]
+
+    def read(fmt, count):
+        nonlocal offset
+        values = struct.unpack_from(f"<{count}{fmt}", data, offset)
+        offset += struct.calcsize(f"<{count}{fmt}")
+        return values
+
+    count = header["count"]
+    types = read("I", count)
+    links = read("I", header["links"] * 4)
+    flows = read("I", header["flows"] * 4)
+    number_refs = read("I", header["numbers"] * 3)
+    vector_refs = read("I", header["vectors"] * 2)
+    offset += -offset % 8
+    number_values = read("d", header["numbers"])
+    vector_values = read("d", header["vectors"] * 3)
+
+    node_ids = header.get("nodeIds", list(range(count)))
+    nodes = [{
+        "id": node_ids[idx],
+        "type": strings[types[idx]],
+        "parameters": {},
+        "configuration": {},
+        "flows": {}
+    } for idx in range(count)]
+
+    for idx in range(0, len(links), 4):
+        node, key, source, socket = links[idx:idx + 4]
+        nodes[node]["parameters"][strings[key]] = {"link": {"nodeId": node_ids[source], "socket": strings[socket]}}
+    for idx in range(0, len(flows), 4):
+        node, key, target, socket = flows[idx:idx + 4]
+        nodes[node]["flows"][strings[key]] = {"nodeId": node_ids[target], "socket": strings[socket]}
+    for idx in range(len(number_values)):
+        node, key, kind = number_refs[idx * 3:idx * 3 + 3]
+        value = number_values[idx]
+        if kind == KIND_INTEGER:
+            value = int(value)
+        elif kind == KIND_BOOLEAN:
+            value = bool(value)
+        nodes[node]["parameters"][strings[key]] = {"value": value}
+    for idx in range(len(vector_values) // 3):
+        node, key = vector_refs[idx * 2:idx * 2 + 2]
+        x, y, z = vector_values[idx * 3:idx * 3 + 3]
+        nodes[node]["parameters"][strings[key]] = {"value": {"x": x, "y": y, "z": z}}
+
+    for extra in header.get("irregular", []):
+        node_data = nodes[extra["node"]]
+        node_data["parameters"].update(extra.get("parameters", {}))
+        node_data["flows"].update(extra.get("flows", {}))
+        node_data["configuration"] = extra.get("configuration", {})
+    return nodes
+
+
+def decode_behavior(behavior, data):
+    behavior = dict(behavior)
+    strings = behavior.pop("strings")
+    behavior.pop("encoding")
+    behavior["nodes"] = decode_node_table(behavior.pop("nodeTable"), data, strings)
+    if "templates" in behavior:
+        templates = []
+        for template in behavior["templates"]:
+            template = dict(template)
+            template["nodes"] = decode_node_table(template.pop("nodeTable"), data, strings)
+            templates.append(template)
+        behavior["templates"] = templates
+    return behavior
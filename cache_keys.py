@@ -0,0 +1,20 @@
+# Parts of the export cache key that don't need Blender data
+
+def get_id_name(id_key):
+    return "/".join(str(part) for part in id_key)
+
+
+def get_entity_states(id_keys, get_state):
+    # States of the given datablocks and of every datablock they reference, directly or through other referenced
+    # datablocks. get_state(id_key, refs) returns the state of a datablock and adds the id keys it references.
+    states = {}
+    pending = list(id_keys)
+    while pending:
+        id_key = pending.pop()
+        name = get_id_name(id_key)
+        if name in states:
+            continue
+        refs = set()
+        states[name] = get_state(id_key, refs)
+        pending.extend(refs)
+    return states
@@ -0,0 +1,30 @@
+from .optimizations import get_value_key
+
+# Event dispatch table. Event nodes are grouped by their type and the entity or custom event they listen to, so
+# the client can register one listener per entry and run the listed entry nodes instead of scanning the nodes.
+
+DISPATCH_KEYS = ["target", "customEventId"]
+
+
+def get_event_dispatch(nodes, event_node_types):
+    # Returns a list of {"type", "target"?, "customEventId"?, "nodes"} in node order
+    entries = {}
+    table = []
+    for node_data in nodes:
+        if node_data["type"] not in event_node_types:
+            continue
+        configuration = node_data.get("configuration", {})
+        entry = {"type": node_data["type"]}
+        for key in DISPATCH_KEYS:
+            if key in configuration:
+                entry[key] = configuration[key]
+        entry_key = get_value_key(entry)
+        if entry_key not in entries:
+            entries[entry_key] = dict(entry, nodes=[])
+            table.append(entries[entry_key])
+        entries[entry_key]["nodes"].append(node_data["id"])
+    return table
+
+
+def rename_event_dispatch(table, node_indices):
+    return [dict(entry, nodes=[node_indices[node_id] for node_id in entry["nodes"]]) for entry in table]
@@ -0,0 +1,83 @@
+from .optimizations import get_linked_node_ids, get_flow_targets
+
+# Execution plan metadata. For every flow node the data nodes it reads from are listed in evaluation order
+# (dependencies first) so the client doesn't need to sort the data dependencies when it loads the graph.
+# Data nodes that depend on their own outputs can't be evaluated, they are returned so they can be reported.
+
+
+def is_data_node(node_data, data_node_types, flow_node_types, flow_targets):
+    if node_data["type"] in data_node_types:
+        return True
+    elif node_data["type"] in flow_node_types:
+        return False
+    # Custom nodes without a spec are flow nodes when they have a flow connected
+    return not node_data["flows"] and not any(
+        (node_data["id"], key) in flow_targets for key in node_data["parameters"].keys())
+
+
+def get_execution_plan(nodes, data_node_types, flow_node_types):
+    # Returns the plan as a list of {"node", "dependencies"} and the ids of the data nodes in a dependency cycle
+    flow_targets = get_flow_targets(nodes)
+    data_nodes = {node_data["id"]: node_data for node_data in nodes
+                  if is_data_node(node_data, data_node_types, flow_node_types, flow_targets)}
+
+    def get_dependencies(node_data):
+        return [node_id for node_id in dict.fromkeys(get_linked_node_ids(node_data)) if node_id in data_nodes]
+
+    # Depth first search over the data nodes, a dependency that is still on the stack closes a cycle
+    cyclic = set()
+    state = {}
+    for node_id in data_nodes:
+        if node_id in state:
+            continue
+        state[node_id] = "visiting"
+        stack = [(node_id, iter(get_dependencies(data_nodes[node_id])))]
+        while stack:
+            current_id, dependencies = stack[-1]
+            for dependency in dependencies:
+                if state.get(dependency) == "visiting":
+                    path = [entry[0] for entry in stack]
+                    cyclic.update(path[path.index(dependency):])
+                elif dependency not in state:
+                    state[dependency] = "visiting"
+                    stack.append((dependency, iter(get_dependencies(data_nodes[dependency]))))
+                    break
+            else:
+                state[current_id] = "done"
+                stack.pop()
+
+    plan = []
+    for node_data in nodes:
+        if node_data["id"] in data_nodes:
+            continue
+        order = []
+        visited = set()
+        valid = True
+        stack = [(node_data["id"], iter(get_dependencies(node_data)))]
+        while stack:
+            current_id, dependencies = stack[-1]
+            for dependency in dependencies:
+                if dependency in cyclic:
+                    valid = False
+                elif dependency not in visited:
+                    visited.add(dependency)
+                    stack.append((dependency, iter(get_dependencies(data_nodes[dependency]))))
+                    break
+            else:
+                stack.pop()
+                if stack:
+                    order.append(current_id)
+        # Flow nodes that read from a cycle are left for the client to handle
+        if valid and order:
+            plan.append({
+                "node": node_data["id"],
+                "dependencies": order
+            })
+    return (plan, cyclic)
+
+
+def rename_execution_plan(plan, node_indices):
+    return [{
+        "node": node_indices[entry["node"]],
+        "dependencies": [node_indices[node_id] for node_id in entry["dependencies"]]
+    } for entry in plan]
@@ -0,0 +1,445 @@
+import bpy
+import hashlib
+import json
+import os
+import tempfile
+from .cache_keys import get_entity_states
+from .serialization import get_canonical_behavior
+from .utils import gather_object_property, gather_cached_material, gather_cached_texture, update_gltf_network_dependencies
+
+# Incremental export cache. Gathered graph instances are kept between exports in a frozen form: node ids are
+# stored without the instance prefix and every glTF object is replaced by a reference to the Blender datablock
+# it was gathered from. glTF objects and their indices are only valid for the export that created them, so
+# cached payloads are thawed against the current export and a reference that can't be resolved anymore turns
+# the lookup into a miss. Changes are tracked through BGTree updates, depsgraph updates and msgbus notifications
+# and the entries that depend on a changed datablock are dropped before the next export.
+# Entries can also be persisted to a cache directory keyed by a hash of everything the gathered payload depends
+# on so a new session exporting the same file can skip gathering the graphs that didn't change.
+
+REF_KEY = "__bg_ref"
+CACHE_FORMAT = 2
+
+__cache = {
+    "entries": {},
+    "tables": None,
+    "settings": None
+}
+__dirty = set()
+__msgbus_owner = object()
+
+
+class FreezeError(Exception):
+    pass
+
+
+def get_id_key(datablock):
+    if isinstance(datablock, bpy.types.Object):
+        kind = "OBJECT"
+    elif isinstance(datablock, bpy.types.Scene):
+        kind = "SCENE"
+    elif isinstance(datablock, bpy.types.NodeTree):
+        kind = "GRAPH"
+    elif isinstance(datablock, bpy.types.Material):
+        kind = "MATERIAL"
+    elif isinstance(datablock, bpy.types.Texture):
+        kind = "TEXTURE"
+    else:
+        raise FreezeError(f"Unsupported datablock {datablock}")
+    library = datablock.library.filepath if datablock.library else None
+    return (kind, datablock.name, library)
+
+
+def find_id(id_key):
+    kind, name, library = id_key
+    collection = {
+        "OBJECT": bpy.data.objects,
+        "SCENE": bpy.data.scenes,
+        "GRAPH": bpy.data.node_groups,
+        "MATERIAL": bpy.data.materials,
+        "TEXTURE": bpy.data.textures
+    }[kind]
+    return collection.get((name, library) if library else name)
+
+
+def mark_dirty(datablock):
+    try:
+        __dirty.add(get_id_key(datablock))
+    except FreezeError:
+        pass
+
+
+def clear_export_cache():
+    __cache["entries"].clear()
+    __cache["tables"] = None
+    __cache["settings"] = None
+    __dirty.clear()
+
+
+def depsgraph_update(depsgraph):
+    for update in depsgraph.updates:
+        datablock = update.id.original
+        if isinstance(datablock, bpy.types.Object) and update.is_updated_transform:
+            # Transforms are not part of the behavior graphs payload
+            continue
+        if isinstance(datablock, (bpy.types.Object, bpy.types.Scene, bpy.types.NodeTree)):
+            mark_dirty(datablock)
+
+
+def tables_changed(*args):
+    # Variable and event ids are positional so any change invalidates every cached payload
+    clear_export_cache()
+
+
+def subscribe_to_tables():
+    from .ui import BGVariableType, BGCustomEventType
+    bpy.msgbus.clear_by_owner(__msgbus_owner)
+    for key in [BGVariableType, BGCustomEventType]:
+        bpy.msgbus.subscribe_rna(
+            key=key,
+            owner=__msgbus_owner,
+            args=(),
+            notify=tables_changed
+        )
+
+
+def unsubscribe_from_tables():
+    bpy.msgbus.clear_by_owner(__msgbus_owner)
+
+
+def get_gltf_source(export_settings, gltf_object):
+    sources = export_settings.setdefault('bg_gltf_sources', {})
+    datablock = sources.get(gltf_object)
+    if datablock is None and bpy.app.version >= (3, 2, 0):
+        # Nodes gathered through the hubs add-on property helpers are not registered, look them up in the vtree
+        for vnode in export_settings['vtree'].nodes.values():
+            if vnode.node is not None and vnode.blender_object is not None and vnode.node not in sources:
+                sources[vnode.node] = vnode.blender_object
+        datablock = sources.get(gltf_object)
+    if datablock is None:
+        raise FreezeError(f"Unknown glTF object {gltf_object}")
+    return datablock
+
+
+def freeze_value(value, export_settings):
+    if value is None or type(value) in [str, int, float, bool]:
+        return value
+    elif type(value) is dict:
+        return {key: freeze_value(item, export_settings) for key, item in value.items()}
+    elif type(value) in [list, tuple]:
+        return [freeze_value(item, export_settings) for item in value]
+    return {REF_KEY: list(get_id_key(get_gltf_source(export_settings, value)))}
+
+
+def thaw_value(value, export_settings):
+    if type(value) is dict:
+        if REF_KEY in value:
+            id_key = tuple(value[REF_KEY])
+            datablock = find_id(id_key)
+            if datablock is None:
+                raise FreezeError(f"{id_key[1]} does not exist")
+            if id_key[0] == "OBJECT":
+                return gather_object_property(export_settings, datablock)["index"]
+            elif id_key[0] == "MATERIAL":
+                return gather_cached_material(datablock, export_settings)
+            elif id_key[0] == "TEXTURE":
+                return gather_cached_texture(datablock, export_settings)
+            raise FreezeError(f"Unsupported reference {id_key}")
+        return {key: thaw_value(item, export_settings) for key, item in value.items()}
+    elif type(value) is list:
+        return [thaw_value(item, export_settings) for item in value]
+    return value
+
+
+def collect_refs(value, refs):
+    if type(value) is dict:
+        if REF_KEY in value:
+            refs.add(tuple(value[REF_KEY]))
+        else:
+            for item in value.values():
+                collect_refs(item, refs)
+    elif type(value) is list:
+        for item in value:
+            collect_refs(item, refs)
+    return refs
+
+
+def rename_node_ids(node_data, rename):
+    node_data = dict(node_data)
+    node_data["id"] = rename(node_data["id"])
+    node_data["parameters"] = {
+        key: {"link": {"nodeId": rename(parameter["link"]["nodeId"]), "socket": parameter["link"]["socket"]}}
+        if "link" in parameter else parameter
+        for key, parameter in node_data["parameters"].items()
+    }
+    node_data["flows"] = {
+        key: {"nodeId": rename(flow["nodeId"]), "socket": flow["socket"]}
+        for key, flow in node_data["flows"].items()
+    }
+    return node_data
+
+
+def get_instance_key(owner, graph, slot_idx):
+    return (get_id_key(owner), get_id_key(graph), slot_idx)
+
+
+def get_rna_value(value, refs):
+    if isinstance(value, bpy.types.ID):
+        id_key = get_id_key(value)
+        refs.add(id_key)
+        return list(id_key)
+    elif isinstance(value, bpy.types.PropertyGroup):
+        return get_rna_state(value, refs)
+    elif isinstance(value, bpy.types.bpy_prop_collection):
+        return [get_rna_value(item, refs) for item in value]
+    elif isinstance(value, set):
+        return sorted(value)
+    elif value is None or type(value) in [str, int, float, bool]:
+        return value
+    return [get_rna_value(item, refs) for item in value]
+
+
+def get_rna_state(struct, refs):
+    # Python defined properties are the ones that carry the behavior graphs data
+    return {prop.identifier: get_rna_value(getattr(struct, prop.identifier), refs)
+            for prop in struct.bl_rna.properties if prop.is_runtime}
+
+
+def get_graph_state(graph, export_settings):
+    graph_states = export_settings.setdefault('bg_graph_states', {})
+    if graph not in graph_states:
+        refs = set()
+        nodes = []
+        for node in graph.nodes:
+            sockets = []
+            for socket in list(node.inputs) + list(node.outputs):
+                sockets.append([
+                    socket.bl_idname,
+                    socket.identifier,
+                    socket.hide,
+                    get_rna_value(socket.default_value, refs) if hasattr(socket, "default_value") else None,
+                    get_rna_state(socket, refs)
+                ])
+            nodes.append([node.bl_idname, node.name, node.label, get_rna_state(node, refs), sockets])
+        links = [[link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier]
+                 for link in graph.links]
+        graph_states[graph] = ([get_rna_state(graph, refs), nodes, links], refs)
+    return graph_states[graph]
+
+
+def get_entity_state(id_key, refs):
+    datablock = find_id(id_key)
+    if datablock is None:
+        return None
+    state = {}
+    if hasattr(datablock, "hubs_component_list"):
+        state["components"] = sorted(datablock.hubs_component_list.items.keys())
+    if hasattr(datablock, "bg_global_variables"):
+        state["variables"] = get_rna_value(datablock.bg_global_variables, refs)
+    if hasattr(datablock, "bg_custom_events"):
+        state["events"] = get_rna_value(datablock.bg_custom_events, refs)
+    if hasattr(datablock, "material_slots"):
+        # Material nodes linked to an entity target the material in its first slot
+        state["materials"] = [get_rna_value(slot.material, refs) for slot in datablock.material_slots]
+    return state
+
+
+def get_instance_hash(owner, graph, slot_idx, export_settings):
+    # Hash of everything the gathered instance depends on: the graph nodes, links and literal values, the owner
+    # and the entities the graph references (ie. through variable default entities), the variables and events tables
+    # and the export settings.
+    from . import bl_info
+    graph_state, graph_refs = get_graph_state(graph, export_settings)
+    owner_key = get_id_key(owner)
+    entities = get_entity_states({owner_key} | graph_refs, get_entity_state)
+    content = json.dumps([
+        CACHE_FORMAT,
+        list(bl_info["version"]),
+        __cache["tables"],
+        list(__cache["settings"]),
+        list(owner_key),
+        slot_idx,
+        graph_state,
+        entities
+    ], sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_cache_dir(export_props):
+    if export_props.export_cache_dir:
+        return bpy.path.abspath(export_props.export_cache_dir)
+    elif bpy.data.filepath:
+        return os.path.join(os.path.dirname(bpy.data.filepath), ".bg_cache")
+    return os.path.join(tempfile.gettempdir(), "bg_cache")
+
+
+def read_disk_entry(export_settings, instance_hash):
+    path = os.path.join(export_settings['bg_cache_dir'], f"{instance_hash}.json")
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if type(data) is not dict or data.get("format") != CACHE_FORMAT:
+        return None
+    return data
+
+
+def write_disk_entry(export_settings, instance_hash, entry):
+    cache_dir = export_settings['bg_cache_dir']
+    path = os.path.join(cache_dir, f"{instance_hash}.json")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump({
+                "format": CACHE_FORMAT,
+                "nodes": entry["nodes"],
+                "network": entry["network"]
+            }, file)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"Behavior graphs cache could not be written: {e}")
+
+
+def begin_cached_export(export_settings, events, variables, export_props):
+    # Drops the entries that depend on datablocks that changed since the last export
+    try:
+        tables = json.dumps([freeze_value(events, export_settings),
+                             freeze_value(variables, export_settings)], sort_keys=True)
+    except FreezeError:
+        tables = None
+    settings = (export_settings['gltf_yup'],)
+    if tables is None or tables != __cache["tables"] or settings != __cache["settings"]:
+        clear_export_cache()
+    __cache["tables"] = tables
+    __cache["settings"] = settings
+
+    entries = __cache["entries"]
+    for key in [key for key, entry in entries.items() if not entry["deps"].isdisjoint(__dirty)]:
+        del entries[key]
+    __dirty.clear()
+    export_settings['bg_cache_touched'] = set()
+    export_settings['bg_use_memory_cache'] = export_props.use_export_cache
+    # Payloads that depend on glTF objects we can't freeze can't be persisted either
+    export_settings['bg_use_disk_cache'] = export_props.use_disk_cache and tables is not None
+    export_settings['bg_cache_dir'] = get_cache_dir(export_props)
+    export_settings['bg_cache_stats'] = {"hits": 0, "misses": 0}
+
+
+def end_cached_export(export_settings, export_report):
+    # Only the instances exported this time are kept so renamed or removed owners don't pile up
+    touched = export_settings.get('bg_cache_touched', set())
+    entries = __cache["entries"]
+    for key in [key for key in entries.keys() if key not in touched]:
+        del entries[key]
+    if export_settings.get('bg_use_disk_cache'):
+        stats = export_settings['bg_cache_stats']
+        export_report.append(
+            f'INFO: Behavior graphs cache: {stats["hits"]} hits, {stats["misses"]} misses ({export_settings["bg_cache_dir"]})')
+
+
+def thaw_entry(entry, prefix, export_settings):
+    from io_hubs_addon.components.components_registry import get_components_registry
+    nodes = [rename_node_ids(thaw_value(node_data, export_settings), lambda id: f"{prefix}_{id}")
+             for node_data in entry["nodes"]]
+    network_dependencies = []
+    for target_key, dep_name, value, source in entry["network"]:
+        target = find_id(tuple(target_key))
+        dep = get_components_registry().get(dep_name)
+        if target is None or dep is None:
+            raise FreezeError(f"{target_key[1]} {dep_name} does not exist")
+        if source is not None:
+            source = f"{prefix}_{source}"
+        network_dependencies.append((target, dep, thaw_value(value, export_settings), source))
+    return (nodes, network_dependencies)
+
+
+def get_entry_deps(key, entry):
+    deps = {key[0], key[1]}
+    for node_data in entry["nodes"]:
+        collect_refs(node_data, deps)
+    for target_key, dep_name, value, source in entry["network"]:
+        deps.add(tuple(target_key))
+        collect_refs(value, deps)
+    return deps
+
+
+def get_cached_instance(owner, graph, slot_idx, prefix, export_settings):
+    key = get_instance_key(owner, graph, slot_idx)
+    result = None
+    if export_settings['bg_use_memory_cache'] and key in __cache["entries"]:
+        try:
+            result = thaw_entry(__cache["entries"][key], prefix, export_settings)
+        except Exception:
+            # Something the payload references is not part of this export, gather the instance again
+            del __cache["entries"][key]
+
+    if result is None and export_settings['bg_use_disk_cache']:
+        instance_hash = get_instance_hash(owner, graph, slot_idx, export_settings)
+        entry = read_disk_entry(export_settings, instance_hash)
+        if entry is not None:
+            try:
+                result = thaw_entry(entry, prefix, export_settings)
+                if export_settings['bg_use_memory_cache']:
+                    entry["deps"] = get_entry_deps(key, entry)
+                    __cache["entries"][key] = entry
+            except Exception:
+                result = None
+
+    if export_settings['bg_use_disk_cache']:
+        export_settings['bg_cache_stats']["hits" if result is not None else "misses"] += 1
+
+    if result is None:
+        return None
+
+    nodes, network_dependencies = result
+    for target, dep, value, source in network_dependencies:
+        export_settings['bg_network_source'] = source
+        try:
+            update_gltf_network_dependencies(None, export_settings, target, dep, value)
+        finally:
+            del export_settings['bg_network_source']
+    export_settings['bg_cache_touched'].add(key)
+    return nodes
+
+
+def store_cached_instance(owner, graph, slot_idx, prefix, nodes, network_log, export_settings):
+    try:
+        key = get_instance_key(owner, graph, slot_idx)
+        start = len(prefix) + 1
+        entry = {
+            "nodes": [freeze_value(rename_node_ids(node_data, lambda id: id[start:]), export_settings)
+                      for node_data in nodes],
+            "network": [[list(get_id_key(target)), dep.get_name(), freeze_value(value, export_settings),
+                         source[start:] if source is not None else None]
+                        for target, dep, value, source in network_log]
+        }
+    except FreezeError:
+        return
+
+    if export_settings['bg_use_memory_cache']:
+        entry["deps"] = get_entry_deps(key, entry)
+        __cache["entries"][key] = entry
+        export_settings['bg_cache_touched'].add(key)
+    if export_settings['bg_use_disk_cache']:
+        write_disk_entry(export_settings, get_instance_hash(owner, graph, slot_idx, export_settings), entry)
+
+
+def get_content_hash(behavior, data, export_settings):
+    # Stable hash of an exported behavior. glTF objects are hashed by the datablock they were gathered from as
+    # their indices depend on the rest of the exported scene.
+    behavior = get_canonical_behavior(behavior)
+
+    def get_ref(gltf_object):
+        try:
+            return {REF_KEY: list(get_id_key(get_gltf_source(export_settings, gltf_object)))}
+        except FreezeError:
+            # Never let two unknown objects share a hash
+            return {REF_KEY: [type(gltf_object).__name__, id(gltf_object)]}
+
+    content = json.dumps(behavior, sort_keys=True, default=get_ref)
+    content_hash = hashlib.sha256(content.encode("utf-8"))
+    if data is not None:
+        content_hash.update(data)
+    return content_hash.hexdigest()
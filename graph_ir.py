@@ -0,0 +1,137 @@
+from io_hubs_addon.io.utils import gather_property
+from .nodes import BGNode
+from .sockets import BGFlowSocket
+from .utils import gather_socket_value, resolve_input_link, resolve_output_link
+
+# Plain data snapshot of a BGTree that is taken once per graph and export and then shared by every owner
+# that uses the graph. Everything that doesn't depend on the exporting owner (links, flows, literal values
+# and spec node configuration) is resolved while taking the snapshot so gathering a graph instance doesn't
+# need to touch RNA again. Owner dependent values are still gathered through the node and socket hooks,
+# those are the only places where the snapshot keeps a reference to the Blender data.
+
+# How an input socket is exported
+PARAM_LINK = 0  # Linked to another node output
+PARAM_VALUE = 1  # Literal value, the same for every owner
+PARAM_SOCKET = 2  # The socket gathers its own parameters for the owner
+PARAM_NODE = 3  # The node gathers the parameter for the owner
+
+
+class IRLink:
+    __slots__ = ("node", "socket")
+
+    def __init__(self, node, socket):
+        self.node = node
+        self.socket = socket
+
+
+class IRInput:
+    __slots__ = ("identifier", "mode", "link", "value", "bl_socket")
+
+    def __init__(self, identifier, mode, link=None, value=None, bl_socket=None):
+        self.identifier = identifier
+        self.mode = mode
+        self.link = link
+        self.value = value
+        self.bl_socket = bl_socket
+
+
+class IRNode:
+    __slots__ = ("name", "label", "node_type", "inputs", "flows", "configuration", "configuration_keys", "error",
+                 "bl_node", "gathers_configuration", "updates_network_dependencies")
+
+    def __init__(self, name, label, node_type):
+        self.name = name
+        self.label = label
+        self.node_type = node_type
+        self.inputs = []
+        self.flows = {}
+        self.configuration = {}
+        self.configuration_keys = []
+        self.error = None
+        self.bl_node = None
+        self.gathers_configuration = False
+        self.updates_network_dependencies = False
+
+
+class IRGraph:
+    __slots__ = ("name", "nodes")
+
+    def __init__(self, name):
+        self.name = name
+        self.nodes = []
+
+
+_hook_cache = {}
+
+
+def has_hook(target, name):
+    # hasattr/callable probes are resolved once per RNA type instead of once per node or socket
+    key = (type(target), name)
+    if key not in _hook_cache:
+        _hook_cache[key] = callable(getattr(type(target), name, None))
+    return _hook_cache[key]
+
+
+def snapshot_node(node, export_settings):
+    ir_node = IRNode(node.name, node.label, node.node_type)
+    try:
+        for output_socket in node.outputs:
+            if isinstance(output_socket, BGFlowSocket) and output_socket.is_linked:
+                link = resolve_output_link(output_socket)
+                ir_node.flows[output_socket.identifier] = IRLink(link.to_node.name, link.to_socket.identifier)
+
+        for input_socket in node.inputs:
+            export = True if not hasattr(input_socket, "export") else input_socket.export
+            if input_socket.is_linked and not input_socket.hide and export:
+                link = resolve_input_link(input_socket)
+                ir_input = IRInput(input_socket.identifier, PARAM_LINK,
+                                   link=IRLink(link.from_node.name, link.from_socket.identifier))
+            elif has_hook(input_socket, "gather_parameters"):
+                ir_input = IRInput(input_socket.identifier, PARAM_SOCKET, bl_socket=input_socket)
+            elif has_hook(node, "gather_parameters"):
+                ir_input = IRInput(input_socket.identifier, PARAM_NODE, bl_socket=input_socket)
+            else:
+                # Sockets without hooks don't depend on the owner, entity sockets always have a hook
+                ir_input = IRInput(input_socket.identifier, PARAM_VALUE,
+                                   value=gather_socket_value(None, export_settings, input_socket))
+            ir_node.inputs.append(ir_input)
+
+        if has_hook(node, "gather_configuration"):
+            ir_node.gathers_configuration = True
+        elif hasattr(node, "__annotations__"):
+            keys = [key for key in node.__annotations__.keys() if not node.is_property_hidden(key)]
+            if any(node.bl_rna.properties[key].type == 'ENUM' for key in keys):
+                # Enum items can depend on the exporting owner (ie. the components of the "self" entity)
+                ir_node.configuration_keys = keys
+            else:
+                for key in keys:
+                    ir_node.configuration[key] = gather_property(export_settings, node, node, key)
+
+        ir_node.updates_network_dependencies = has_hook(node, "update_network_dependencies")
+
+        if ir_node.gathers_configuration or ir_node.configuration_keys or ir_node.updates_network_dependencies or any(
+                ir_input.bl_socket is not None for ir_input in ir_node.inputs):
+            ir_node.bl_node = node
+
+    except Exception as e:
+        # Errors are reported for every owner that gathers the node, same as when gathering from RNA
+        ir_node.error = str(e)
+
+    return ir_node
+
+
+def snapshot_graph(graph, export_settings):
+    ir_graph = IRGraph(graph.name)
+    for node in graph.nodes:
+        if isinstance(node, BGNode):
+            ir_graph.nodes.append(snapshot_node(node, export_settings))
+    return ir_graph
+
+
+def get_graph_ir(graph, export_settings):
+    graph_irs = export_settings.setdefault('bg_graph_ir', {})
+    ir_graph = graph_irs.get(graph)
+    if ir_graph is None:
+        ir_graph = snapshot_graph(graph, export_settings)
+        graph_irs[graph] = ir_graph
+    return ir_graph
@@ -0,0 +1,97 @@
+from .optimizations import get_flow_targets, get_data_link_node_ids
+
+# Networking analysis. The networked components that nodes add to their targets are only needed when the target
+# state can differ between clients. Nodes that only run from lifecycle/onStart through synchronous flows, and only
+# read constants, set the same state on every client (late joiners included) so their targets don't need them.
+
+DETERMINISTIC_EVENTS = {"lifecycle/onStart"}
+# Flow nodes that trigger their outputs later, when clients that joined at different times are out of sync
+ASYNC_FLOW_NODES = {"time/delay", "time/set", "flow/debounce", "flow/throttle"}
+# Components that only synchronize state, networked variables are always needed as they declare the variables
+OPTIONAL_COMPONENTS = {
+    "networked-transform",
+    "networked-animation",
+    "networked-material",
+    "networked-object-material",
+    "networked-object-properties"
+}
+
+
+def get_flow_sources(nodes):
+    flow_sources = {}
+    for node_data in nodes:
+        for key, flow in node_data["flows"].items():
+            flow_sources.setdefault(flow["nodeId"], []).append((node_data["id"], key))
+    return flow_sources
+
+
+def get_network_decisions(nodes, network_plan, constant_node_types):
+    # Returns (target, dep, networked, reason) for every planned dependency on an optional component
+    nodes_by_id = {node_data["id"]: node_data for node_data in nodes}
+    flow_targets = get_flow_targets(nodes)
+    flow_sources = get_flow_sources(nodes)
+    constant = {}
+    divergence = {}
+
+    def is_constant(node_id):
+        if node_id not in constant:
+            # Data cycles are never constant
+            constant[node_id] = False
+            node_data = nodes_by_id.get(node_id)
+            constant[node_id] = (node_data is not None and node_data["type"] in constant_node_types and
+                                 has_constant_inputs(node_data))
+        return constant[node_id]
+
+    def has_constant_inputs(node_data):
+        return all(is_constant(node_id) for node_id in get_data_link_node_ids(node_data, flow_targets))
+
+    def find_divergence(node_id):
+        node_data = nodes_by_id.get(node_id)
+        if node_data is None:
+            return f"{node_id} is not exported"
+        if node_data["type"] in DETERMINISTIC_EVENTS:
+            return None
+        sources = flow_sources.get(node_id, [])
+        if not sources:
+            return f"{node_id} doesn't run from lifecycle/onStart"
+        if not has_constant_inputs(node_data):
+            return f"{node_id} has inputs that are not constant"
+        for source_id, key in sources:
+            source_type = nodes_by_id[source_id]["type"]
+            if source_type in ASYNC_FLOW_NODES or not (
+                    source_type in DETERMINISTIC_EVENTS or source_type.startswith("flow/") or key == "flow"):
+                return f"{node_id} runs from the {key} output of {source_id}"
+            reason = get_divergence(source_id)
+            if reason:
+                return reason
+        return None
+
+    def get_divergence(node_id):
+        # Returns why the node can run differently on each client, or None when it runs the same everywhere
+        if node_id not in divergence:
+            divergence[node_id] = f"{node_id} is in a flow loop"
+            divergence[node_id] = find_divergence(node_id)
+        return divergence[node_id]
+
+    decisions = []
+    for (target, dep), entry in network_plan.items():
+        if target is None or dep.get_name() not in OPTIONAL_COMPONENTS:
+            continue
+        reason = None
+        for source in entry["sources"]:
+            reason = get_divergence(source) if source is not None else "requested outside of a graph node"
+            if reason:
+                break
+        if reason:
+            decisions.append((target, dep, True, reason))
+        else:
+            decisions.append((target, dep, False, "only set from lifecycle/onStart with constant inputs"))
+    return decisions
+
+
+def disable_networking(nodes, node_ids):
+    # Nodes that requested a component that is not added anymore are exported as not networked, so the client
+    # doesn't look for the missing component
+    return [dict(node_data, configuration=dict(node_data["configuration"], networked=False))
+            if node_data["id"] in node_ids and node_data["configuration"].get("networked") is True else node_data
+            for node_data in nodes]
@@ -2,7 +2,7 @@ import bpy
 from bpy.props import PointerProperty, StringProperty
 from bpy.types import Node
 from io_hubs_addon.io.utils import gather_property
-from .utils import gather_object_property, gather_socket_value, filter_on_components, filter_entity_type, get_prefs, object_exists, createSocketForComponentProperty, get_input_entity, get_variable_value
+from .utils import gather_object_property, gather_socket_value, filter_on_components, filter_entity_type, get_prefs, object_exists, createSocketForComponentProperty, get_input_entity, get_variable_value, get_input_link
 from .consts import MATERIAL_PROPERTIES_ENUM, MATERIAL_PROPERTIES_TO_TYPES, SUPPORTED_COMPONENTS, SUPPORTED_PROPERTY_COMPONENTS
 from .sockets import BGFlowSocket
 
@@ -17,6 +17,8 @@ def update_networked_color(self, context):
 class BGNode():
     bl_label = "Behavior Graph Node"
     bl_icon = "NODE"
+    # Whether the node has flow sockets, nodes without them are evaluated when their outputs are read
+    flow_node = False
 
     category: bpy.props.StringProperty()
 
@@ -34,6 +36,8 @@ class BGNode():
 
 
 class BGEventNode():
+    flow_node = True
+
     def init(self, context):
         super().init(context)
         self.color = (0.6, 0.2, 0.2)
@@ -41,6 +45,8 @@ class BGEventNode():
 
 
 class BGActionNode():
+    flow_node = True
+
     def init(self, context):
         super().init(context)
         self.color = (0.2, 0.2, 0.6)
@@ -301,6 +307,7 @@ def update_output_sockets(self, context):
 class BGNode_flow_sequence(BGNode, Node):
     bl_label = "Sequence"
     node_type = "flow/sequence"
+    flow_node = True
 
     numOutputs: bpy.props.IntProperty(
         name="Outputs",
@@ -1326,8 +1333,8 @@ class BGNode_get_component_property(BGNode, Node):
 def get_material_socket_value(socket, context):
     value = None
     if socket:
-        if socket.is_linked and len(socket.links) > 0:
-            link = socket.links[0]
+        link = get_input_link(socket)
+        if link:
             from_node = link.from_socket.node
             entity = get_input_entity(from_node, context)
             if len(entity.material_slots) > 0:
@@ -1470,6 +1477,7 @@ class BGNode_media_mediaPlayback(BGNetworked, BGActionNode, BGNode, Node):
 class BGNode_media_frame_setMediaFrameProperty(BGNode, Node):
     bl_label = "Set Media Frame Property"
     node_type = "media_frame/setMediaFrameProperty"
+    flow_node = True
 
     def init(self, context):
         super().init(context)
@@ -1484,6 +1492,7 @@ class BGNode_media_frame_setMediaFrameProperty(BGNode, Node):
 class BGNode_physics_setRigidBodyActive(BGNetworked, BGNode, Node):
     bl_label = "Set Active"
     node_type = "physics/setRigidBodyActive"
+    flow_node = True
 
     def init(self, context):
         super().init(context)
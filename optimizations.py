@@ -0,0 +1,460 @@
+import math
+
+# Export time optimization passes. They work on the gathered node dictionaries of a single graph instance and
+# return new node lists. Parameter values can be shared between instances (literal values come from the graph
+# snapshot) so passes replace dictionaries instead of modifying them.
+
+
+def get_linked_node_ids(node_data):
+    return [parameter["link"]["nodeId"] for parameter in node_data["parameters"].values() if "link" in parameter]
+
+
+def get_flow_targets(nodes):
+    # Linked flow inputs are also exported as parameter links, these are the (node id, input) pairs they use
+    return {(flow["nodeId"], flow["socket"]) for node_data in nodes for flow in node_data["flows"].values()}
+
+
+def get_data_link_node_ids(node_data, flow_targets):
+    return [parameter["link"]["nodeId"] for key, parameter in node_data["parameters"].items()
+            if "link" in parameter and (node_data["id"], key) not in flow_targets]
+
+
+def eliminate_dead_nodes(nodes, event_node_types):
+    # Keeps the nodes that can run: event nodes, everything their flows reach and the nodes those read data from.
+    # Returns the kept and the removed nodes.
+    nodes_by_id = {node_data["id"]: node_data for node_data in nodes}
+    flow_targets = get_flow_targets(nodes)
+    reachable = set()
+    pending = [node_data["id"] for node_data in nodes if node_data["type"] in event_node_types]
+    while pending:
+        node_id = pending.pop()
+        if node_id in reachable or node_id not in nodes_by_id:
+            continue
+        reachable.add(node_id)
+        node_data = nodes_by_id[node_id]
+        pending.extend(flow["nodeId"] for flow in node_data["flows"].values())
+        pending.extend(get_data_link_node_ids(node_data, flow_targets))
+
+    kept = []
+    for node_data in nodes:
+        if node_data["id"] not in reachable:
+            continue
+        # Flow inputs linked from removed nodes are dropped so the kept nodes don't link to missing nodes
+        parameters = {key: parameter for key, parameter in node_data["parameters"].items()
+                      if "link" not in parameter or (node_data["id"], key) not in flow_targets or
+                      parameter["link"]["nodeId"] in reachable}
+        if len(parameters) != len(node_data["parameters"]):
+            node_data = dict(node_data, parameters=parameters)
+        kept.append(node_data)
+    removed = [node_data for node_data in nodes if node_data["id"] not in reachable]
+    return (kept, removed)
+
+
+def js_round(a):
+    # Math.round rounds halves towards +Infinity. a + 0.5 can round up in floating point (ie. for
+    # 0.49999999999999994) so the fractional part is compared instead.
+    floor = math.floor(a)
+    return float(floor + 1 if a - floor >= 0.5 else floor)
+
+
+def js_sign(a):
+    return float((a > 0) - (a < 0))
+
+
+def int_divide(a, b):
+    # BigInt division truncates towards zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def int_modulus(a, b):
+    # BigInt remainder has the sign of the dividend
+    return a - b * int_divide(a, b)
+
+
+def clamp(value, min_value, max_value):
+    return min_value if value < min_value else max_value if value > max_value else value
+
+
+def vec3(x, y, z):
+    return {"x": float(x), "y": float(y), "z": float(z)}
+
+
+def vec3_length(a):
+    return math.sqrt(a["x"] * a["x"] + a["y"] * a["y"] + a["z"] * a["z"])
+
+
+def vec3_normalize(a):
+    length = vec3_length(a) or 1
+    return vec3(a["x"] / length, a["y"] / length, a["z"] / length)
+
+
+def float_result(func):
+    return lambda p: {"result": float(func(p))}
+
+
+def int_result(func):
+    return lambda p: {"result": int(func(p))}
+
+
+def bool_result(func):
+    return lambda p: {"result": bool(func(p))}
+
+
+def vec3_result(func):
+    return lambda p: {"result": func(p)}
+
+
+# Pure spec math nodes that are folded when all their inputs are literals, evaluated with the same semantics as
+# the client. Nodes with non deterministic results (random), string formatting that differs from JavaScript
+# (toString) and Euler math are left for the client.
+FOLDABLE_NODES = {
+    "math/float": float_result(lambda p: p["a"]),
+    "math/add/float": float_result(lambda p: p["a"] + p["b"]),
+    "math/subtract/float": float_result(lambda p: p["a"] - p["b"]),
+    "math/negate/float": float_result(lambda p: -p["a"]),
+    "math/multiply/float": float_result(lambda p: p["a"] * p["b"]),
+    "math/divide/float": float_result(lambda p: p["a"] / p["b"]),
+    "math/modulus/float": float_result(lambda p: math.fmod(p["a"], p["b"])),
+    "math/pow/float": float_result(lambda p: math.pow(p["a"], p["b"])),
+    "math/sqrt/float": float_result(lambda p: math.sqrt(p["a"])),
+    "math/e/float": float_result(lambda p: math.e),
+    "math/exp/float": float_result(lambda p: math.exp(p["a"])),
+    "math/ln/float": float_result(lambda p: math.log(p["a"])),
+    "math/log2/float": float_result(lambda p: math.log2(p["a"])),
+    "math/log10/float": float_result(lambda p: math.log10(p["a"])),
+    "math/pi/float": float_result(lambda p: math.pi),
+    "math/sin/float": float_result(lambda p: math.sin(p["a"])),
+    "math/asin/float": float_result(lambda p: math.asin(p["a"])),
+    "math/cos/float": float_result(lambda p: math.cos(p["a"])),
+    "math/acos/float": float_result(lambda p: math.acos(p["a"])),
+    "math/tan/float": float_result(lambda p: math.tan(p["a"])),
+    "math/atan/float": float_result(lambda p: math.atan(p["a"])),
+    "math/radiansToDegrees/float": float_result(lambda p: math.degrees(p["a"])),
+    "math/degreesToRadians/float": float_result(lambda p: math.radians(p["a"])),
+    "math/mix/float": float_result(lambda p: p["a"] * (1 - p["c"]) + p["b"] * p["c"]),
+    "math/toFloat/float": float_result(lambda p: p["a"]),
+    "math/min/float": float_result(lambda p: min(p["a"], p["b"])),
+    "math/max/float": float_result(lambda p: max(p["a"], p["b"])),
+    "math/clamp/float": float_result(lambda p: clamp(p["a"], p["b"], p["c"])),
+    "math/abs/float": float_result(lambda p: abs(p["a"])),
+    "math/sign/float": float_result(lambda p: js_sign(p["a"])),
+    "math/floor/float": float_result(lambda p: math.floor(p["a"])),
+    "math/ceil/float": float_result(lambda p: math.ceil(p["a"])),
+    "math/round/float": float_result(lambda p: js_round(p["a"])),
+    "math/trunc/float": float_result(lambda p: math.trunc(p["a"])),
+    "math/equal/float": bool_result(lambda p: p["a"] == p["b"]),
+    "math/greaterThan/float": bool_result(lambda p: p["a"] > p["b"]),
+    "math/greaterThanOrEqual/float": bool_result(lambda p: p["a"] >= p["b"]),
+    "math/lessThan/float": bool_result(lambda p: p["a"] < p["b"]),
+    "math/lessThanOrEqual/float": bool_result(lambda p: p["a"] <= p["b"]),
+    "math/isNaN/float": bool_result(lambda p: math.isnan(p["a"])),
+    "math/isInf/float": bool_result(lambda p: math.isinf(p["a"])),
+
+    "math/integer": int_result(lambda p: p["a"]),
+    "math/add/integer": int_result(lambda p: p["a"] + p["b"]),
+    "math/subtract/integer": int_result(lambda p: p["a"] - p["b"]),
+    "math/negate/integer": int_result(lambda p: -p["a"]),
+    "math/multiply/integer": int_result(lambda p: p["a"] * p["b"]),
+    "math/divide/integer": int_result(lambda p: int_divide(p["a"], p["b"])),
+    "math/modulus/integer": int_result(lambda p: int_modulus(p["a"], p["b"])),
+    "math/toFloat/integer": float_result(lambda p: p["a"]),
+    "math/min/integer": int_result(lambda p: min(p["a"], p["b"])),
+    "math/max/integer": int_result(lambda p: max(p["a"], p["b"])),
+    "math/clamp/integer": int_result(lambda p: clamp(p["value"], p["min"], p["max"])),
+    "math/abs/integer": int_result(lambda p: abs(p["a"])),
+    "math/sign/integer": int_result(lambda p: (p["a"] > 0) - (p["a"] < 0)),
+    "math/equal/integer": bool_result(lambda p: p["a"] == p["b"]),
+    "math/greaterThan/integer": bool_result(lambda p: p["a"] > p["b"]),
+    "math/greaterThanOrEqual/integer": bool_result(lambda p: p["a"] >= p["b"]),
+    "math/lessThan/integer": bool_result(lambda p: p["a"] < p["b"]),
+    "math/lessThanOrEqual/integer": bool_result(lambda p: p["a"] <= p["b"]),
+    "math/toBoolean/integer": bool_result(lambda p: p["a"] != 0),
+
+    "math/boolean": bool_result(lambda p: p["a"]),
+    "math/and/boolean": bool_result(lambda p: p["a"] and p["b"]),
+    "math/or/boolean": bool_result(lambda p: p["a"] or p["b"]),
+    "math/negate/boolean": bool_result(lambda p: not p["a"]),
+    "math/equal/boolean": bool_result(lambda p: p["a"] == p["b"]),
+    "math/toFloat/boolean": float_result(lambda p: 1 if p["a"] else 0),
+    "math/toInteger/boolean": int_result(lambda p: 1 if p["a"] else 0),
+
+    "math/vec3": vec3_result(lambda p: vec3(p["a"]["x"], p["a"]["y"], p["a"]["z"])),
+    "math/vec3/combine": lambda p: {"v": vec3(p["x"], p["y"], p["z"])},
+    "math/vec3/separate": lambda p: {"x": float(p["v"]["x"]), "y": float(p["v"]["y"]), "z": float(p["v"]["z"])},
+    "math/toVec3/float": vec3_result(lambda p: vec3(p["x"], p["y"], p["z"])),
+    "math/toFloat/vec3": lambda p: {"x": float(p["a"]["x"]), "y": float(p["a"]["y"]), "z": float(p["a"]["z"])},
+    "math/add/vec3": vec3_result(lambda p: vec3(p["a"]["x"] + p["b"]["x"], p["a"]["y"] + p["b"]["y"], p["a"]["z"] + p["b"]["z"])),
+    "math/subtract/vec3": vec3_result(lambda p: vec3(p["a"]["x"] - p["b"]["x"], p["a"]["y"] - p["b"]["y"], p["a"]["z"] - p["b"]["z"])),
+    "math/negate/vec3": vec3_result(lambda p: vec3(-p["a"]["x"], -p["a"]["y"], -p["a"]["z"])),
+    "math/scale/vec3": vec3_result(lambda p: vec3(p["a"]["x"] * p["b"], p["a"]["y"] * p["b"], p["a"]["z"] * p["b"])),
+    "math/length/vec3": float_result(lambda p: vec3_length(p["a"])),
+    "math/normalize/vec3": vec3_result(lambda p: vec3_normalize(p["a"])),
+    "math/cross/vec3": vec3_result(lambda p: vec3(
+        p["a"]["y"] * p["b"]["z"] - p["a"]["z"] * p["b"]["y"],
+        p["a"]["z"] * p["b"]["x"] - p["a"]["x"] * p["b"]["z"],
+        p["a"]["x"] * p["b"]["y"] - p["a"]["y"] * p["b"]["x"])),
+    "math/dot/vec3": float_result(lambda p: p["a"]["x"] * p["b"]["x"] + p["a"]["y"] * p["b"]["y"] + p["a"]["z"] * p["b"]["z"]),
+    "math/mix/vec3": vec3_result(lambda p: vec3(
+        p["a"]["x"] + (p["b"]["x"] - p["a"]["x"]) * p["t"],
+        p["a"]["y"] + (p["b"]["y"] - p["a"]["y"]) * p["t"],
+        p["a"]["z"] + (p["b"]["z"] - p["a"]["z"]) * p["t"])),
+}
+
+
+def is_valid_constant(value):
+    if type(value) is float:
+        return math.isfinite(value)
+    elif type(value) is dict:
+        return all(is_valid_constant(item) for item in value.values())
+    return True
+
+
+def fold_constants(nodes, node_specs):
+    # Evaluates the foldable nodes whose inputs are all literals (or other folded nodes), replaces the links to
+    # them with literal values and removes them. Returns the new node list and the folded nodes.
+    nodes_by_id = {node_data["id"]: node_data for node_data in nodes}
+    outputs = {}
+
+    def evaluate(node_id):
+        if node_id in outputs:
+            return outputs[node_id]
+        outputs[node_id] = None
+        node_data = nodes_by_id.get(node_id)
+        if node_data is None or node_data["type"] not in FOLDABLE_NODES or node_data["flows"]:
+            return None
+        values = {}
+        for key, parameter in node_data["parameters"].items():
+            if "link" in parameter:
+                linked_outputs = evaluate(parameter["link"]["nodeId"])
+                if linked_outputs is None or parameter["link"]["socket"] not in linked_outputs:
+                    return None
+                values[key] = linked_outputs[parameter["link"]["socket"]]
+            else:
+                values[key] = parameter["value"]
+        node_spec = node_specs.get(node_data["type"])
+        if node_spec:
+            for input_spec in node_spec["inputs"]:
+                if input_spec["name"] not in values and "defaultValue" in input_spec:
+                    values[input_spec["name"]] = input_spec["defaultValue"]
+        try:
+            result = FOLDABLE_NODES[node_data["type"]](values)
+        except (ArithmeticError, ValueError, KeyError, TypeError):
+            return None
+        if not is_valid_constant(result):
+            return None
+        outputs[node_id] = result
+        return result
+
+    for node_data in nodes:
+        evaluate(node_data["id"])
+
+    folded = [node_data for node_data in nodes if outputs.get(node_data["id"]) is not None]
+    if not folded:
+        return (nodes, folded)
+
+    result = []
+    for node_data in nodes:
+        if outputs.get(node_data["id"]) is not None:
+            continue
+        parameters = {}
+        for key, parameter in node_data["parameters"].items():
+            if "link" in parameter and outputs.get(parameter["link"]["nodeId"]) is not None:
+                parameter = {"value": outputs[parameter["link"]["nodeId"]][parameter["link"]["socket"]]}
+            parameters[key] = parameter
+        result.append(dict(node_data, parameters=parameters))
+    return (result, folded)
+
+
+def get_value_key(value):
+    # Hashable key for a parameter or configuration value. glTF objects are compared by identity.
+    if type(value) is dict:
+        return ("dict", tuple(sorted((key, get_value_key(item)) for key, item in value.items())))
+    elif type(value) is list:
+        return ("list", tuple(get_value_key(item) for item in value))
+    elif value is None or type(value) in [str, int, float, bool]:
+        return (type(value).__name__, value)
+    return ("object", id(value))
+
+
+def merge_common_subexpressions(nodes, pure_node_types):
+    # Pure nodes with the same type, configuration and inputs compute the same value every time they are read,
+    # so only the first one is kept and the links to the others are pointed to it.
+    # Returns the new node list and the merged nodes.
+    nodes_by_id = {node_data["id"]: node_data for node_data in nodes}
+    representatives = {}
+    node_keys = {}
+
+    def get_representative(node_id):
+        if node_id in representatives:
+            return representatives[node_id]
+        representatives[node_id] = node_id
+        node_data = nodes_by_id.get(node_id)
+        if node_data is None or node_data["type"] not in pure_node_types or node_data["flows"]:
+            return node_id
+        parameters = []
+        for key, parameter in sorted(node_data["parameters"].items()):
+            if "link" in parameter:
+                link = parameter["link"]
+                parameters.append((key, "link", get_representative(link["nodeId"]), link["socket"]))
+            else:
+                parameters.append((key, "value", get_value_key(parameter.get("value"))))
+        node_key = (node_data["type"], get_value_key(node_data["configuration"]), tuple(parameters))
+        representatives[node_id] = node_keys.setdefault(node_key, node_id)
+        return representatives[node_id]
+
+    for node_data in nodes:
+        get_representative(node_data["id"])
+
+    merged = [node_data for node_data in nodes if representatives[node_data["id"]] != node_data["id"]]
+    if not merged:
+        return (nodes, merged)
+
+    result = []
+    for node_data in nodes:
+        if representatives[node_data["id"]] != node_data["id"]:
+            continue
+        parameters = {}
+        for key, parameter in node_data["parameters"].items():
+            if "link" in parameter and representatives.get(parameter["link"]["nodeId"], parameter["link"]["nodeId"]) != parameter["link"]["nodeId"]:
+                parameter = {
+                    "link": {
+                        "nodeId": representatives[parameter["link"]["nodeId"]],
+                        "socket": parameter["link"]["socket"]
+                    }
+                }
+            parameters[key] = parameter
+        result.append(dict(node_data, parameters=parameters))
+    return (result, merged)
+
+
+# Conversions whose "result" output is the value of one of their inputs
+IDENTITY_NODES = {
+    "math/toFloat/float": "a",
+    "math/float": "a",
+    "math/integer": "a",
+    "math/boolean": "a",
+    "math/vec3": "a",
+    "logic/string": "a"
+}
+
+# (outer node type, outer output): (outer input, inner node type, inner input). The outer node output is the
+# inner node input when the outer input is linked to the inner node. Only lossless inner conversions are listed,
+# ie. float -> integer -> float truncates so it's not a round trip.
+ROUND_TRIPS = {
+    ("math/toBoolean/integer", "result"): ("a", "math/toInteger/boolean", "a"),
+    ("math/toFloat/vec3", "x"): ("a", "math/toVec3/float", "x"),
+    ("math/toFloat/vec3", "y"): ("a", "math/toVec3/float", "y"),
+    ("math/toFloat/vec3", "z"): ("a", "math/toVec3/float", "z"),
+    ("math/vec3/separate", "x"): ("v", "math/vec3/combine", "x"),
+    ("math/vec3/separate", "y"): ("v", "math/vec3/combine", "y"),
+    ("math/vec3/separate", "z"): ("v", "math/vec3/combine", "z")
+}
+
+# outer node type: (outer output, inner node type, inner input). The outer node output is the inner node input
+# when the x, y and z inputs are linked to the matching outputs of the same inner node.
+VECTOR_ROUND_TRIPS = {
+    "math/toVec3/float": ("result", "math/toFloat/vec3", "a"),
+    "math/vec3/combine": ("v", "math/vec3/separate", "v")
+}
+
+# Conversions that are replaced by their result when their inputs are literals
+LITERAL_CASTS = [
+    "math/toFloat/integer",
+    "math/toFloat/boolean",
+    "math/toInteger/boolean",
+    "math/toBoolean/integer",
+    "math/toFloat/vec3",
+    "math/toVec3/float",
+    "math/vec3/combine",
+    "math/vec3/separate"
+]
+
+
+def remove_redundant_casts(nodes):
+    # Points the links to identity conversions and round trip casts to the original value, replaces casts of
+    # literals with the converted literal and removes the conversion nodes that are not used anymore.
+    # Returns the new node list and the removed nodes.
+    nodes_by_id = {node_data["id"]: node_data for node_data in nodes}
+    aliases = {}
+
+    def resolve(parameter):
+        if "link" in parameter:
+            alias = get_alias(parameter["link"]["nodeId"], parameter["link"]["socket"])
+            if alias is not None:
+                return alias
+        return parameter
+
+    def get_inner_node(parameter, inner_type):
+        if "link" not in parameter:
+            return None
+        inner_node = nodes_by_id.get(parameter["link"]["nodeId"])
+        if inner_node is None or inner_node["type"] != inner_type:
+            return None
+        return inner_node
+
+    def find_alias(node_data, socket):
+        node_type = node_data["type"]
+        parameters = node_data["parameters"]
+        if node_type in IDENTITY_NODES and socket == "result" and IDENTITY_NODES[node_type] in parameters:
+            return resolve(parameters[IDENTITY_NODES[node_type]])
+
+        if (node_type, socket) in ROUND_TRIPS:
+            outer_input, inner_type, inner_input = ROUND_TRIPS[(node_type, socket)]
+            inner_node = get_inner_node(resolve(parameters.get(outer_input, {})), inner_type)
+            if inner_node and inner_input in inner_node["parameters"]:
+                return resolve(inner_node["parameters"][inner_input])
+
+        if node_type in VECTOR_ROUND_TRIPS and socket == VECTOR_ROUND_TRIPS[node_type][0]:
+            _, inner_type, inner_input = VECTOR_ROUND_TRIPS[node_type]
+            components = [resolve(parameters.get(component, {})) for component in ["x", "y", "z"]]
+            inner_nodes = [get_inner_node(parameter, inner_type) for parameter in components]
+            if inner_nodes[0] and all(inner_node is inner_nodes[0] for inner_node in inner_nodes) and all(
+                    parameter["link"]["socket"] == component for parameter, component in zip(components, ["x", "y", "z"])):
+                if inner_input in inner_nodes[0]["parameters"]:
+                    return resolve(inner_nodes[0]["parameters"][inner_input])
+
+        if node_type in LITERAL_CASTS:
+            values = {key: resolve(parameter) for key, parameter in parameters.items()}
+            if values and all("value" in parameter for parameter in values.values()):
+                try:
+                    outputs = FOLDABLE_NODES[node_type]({key: parameter["value"] for key, parameter in values.items()})
+                except (ArithmeticError, ValueError, KeyError, TypeError):
+                    return None
+                if socket in outputs and is_valid_constant(outputs[socket]):
+                    return {"value": outputs[socket]}
+
+        return None
+
+    def get_alias(node_id, socket):
+        key = (node_id, socket)
+        if key not in aliases:
+            aliases[key] = None
+            node_data = nodes_by_id.get(node_id)
+            if node_data is not None and not node_data["flows"]:
+                aliases[key] = find_alias(node_data, socket)
+        return aliases[key]
+
+    result = []
+    for node_data in nodes:
+        parameters = {key: resolve(parameter) for key, parameter in node_data["parameters"].items()}
+        result.append(dict(node_data, parameters=parameters))
+
+    # Conversions that were only read by the bypassed ones are not needed anymore either
+    conversion_types = set(IDENTITY_NODES.keys()) | set(LITERAL_CASTS) | {
+        node_type for node_type, _ in ROUND_TRIPS.keys()} | set(VECTOR_ROUND_TRIPS.keys())
+    previously_used = {node_id for node_data in nodes for node_id in get_linked_node_ids(node_data)}
+    removed_ids = set()
+    while True:
+        used = {node_id for node_data in result if node_data["id"] not in removed_ids
+                for node_id in get_linked_node_ids(node_data)}
+        unused = {node_data["id"] for node_data in result if node_data["id"] not in removed_ids and
+                  node_data["type"] in conversion_types and not node_data["flows"] and
+                  node_data["id"] in previously_used and node_data["id"] not in used}
+        if not unused:
+            break
+        removed_ids.update(unused)
+
+    removed = [node_data for node_data in nodes if node_data["id"] in removed_ids]
+    result = [node_data for node_data in result if node_data["id"] not in removed_ids]
+    return (result, removed)
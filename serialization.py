@@ -0,0 +1,222 @@
+# Output format transforms applied to a gathered behavior before it's written to the MOZ_behavior extension.
+# They return new dictionaries and leave the node dictionaries they get untouched. The behavior nodes can be any
+# iterable, the node transforms are generators so no intermediate node list is built between them.
+
+from .optimizations import get_value_key
+
+ENTITY_KEY = "entity"
+
+
+def iter_graph_nodes(graph_instances):
+    # Hands out the nodes of one graph instance at a time and drops them from the instance, so the gathered nodes
+    # of an instance can be freed once they have been transformed into the output nodes
+    for graph_instance in graph_instances:
+        nodes = graph_instance["nodes"]
+        graph_instance["nodes"] = None
+        yield from nodes
+
+
+def iter_compact_nodes(nodes, node_ids):
+    node_indices = {node_id: idx for idx, node_id in enumerate(node_ids)}
+
+    def get_index(node_id):
+        # Links to nodes that failed to export keep their name so they are still recognizable in the output
+        return node_indices.get(node_id, node_id)
+
+    for node_data in nodes:
+        parameters = {}
+        for key, parameter in node_data["parameters"].items():
+            if "link" in parameter:
+                parameter = {"link": {"nodeId": get_index(parameter["link"]["nodeId"]), "socket": parameter["link"]["socket"]}}
+            parameters[key] = parameter
+        flows = {key: {"nodeId": get_index(flow["nodeId"]), "socket": flow["socket"]}
+                 for key, flow in node_data["flows"].items()}
+        yield dict(node_data, id=node_indices[node_data["id"]], parameters=parameters, flows=flows)
+
+
+def compact_nodes(nodes):
+    # Returns the nodes with their ids and links replaced by node indices and the original ids
+    node_ids = [node_data["id"] for node_data in nodes]
+    return (list(iter_compact_nodes(nodes, node_ids)), node_ids)
+
+
+def compact_node_ids(behavior, keep_names, node_ids):
+    # Node ids and links become indices into the node list of the behavior (or template). The original names are
+    # only written to the debugNames section when requested. node_ids are the ids of the behavior nodes in order.
+    behavior = dict(behavior)
+    debug_names = {}
+    behavior["nodes"] = iter_compact_nodes(behavior["nodes"], node_ids)
+    debug_names["nodes"] = node_ids
+
+    if "templates" in behavior:
+        templates = []
+        template_names = []
+        template_indices = []
+        for template in behavior["templates"]:
+            template_nodes, names = compact_nodes(template["nodes"])
+            templates.append(dict(template, nodes=template_nodes))
+            template_names.append(names)
+            template_indices.append({name: idx for idx, name in enumerate(names)})
+        behavior["templates"] = templates
+        debug_names["templates"] = template_names
+
+        instances = []
+        for instance in behavior["instances"]:
+            instance = dict(instance)
+            if "overrides" in instance:
+                node_indices = template_indices[instance["template"]]
+                instance["overrides"] = {str(node_indices[node_id]): overrides
+                                         for node_id, overrides in instance["overrides"].items()}
+            instances.append(instance)
+        debug_names["instances"] = [instance.pop("idPrefix") for instance in instances]
+        behavior["instances"] = instances
+
+    if keep_names:
+        behavior["debugNames"] = debug_names
+    return behavior
+
+
+def is_default_value(value, default_value):
+    if type(value) is dict and type(default_value) is dict:
+        return value.keys() == default_value.keys() and all(
+            is_default_value(value[key], default_value[key]) for key in value.keys())
+    # Booleans compare equal to 0 and 1 so they only match other booleans
+    if (type(value) is bool) != (type(default_value) is bool):
+        return False
+    return type(value) in [str, int, float, bool] and value == default_value
+
+
+def minify_nodes(nodes, node_specs):
+    for node_data in nodes:
+        node_spec = node_specs.get(node_data["type"])
+        defaults = {input_spec["name"]: input_spec["defaultValue"]
+                    for input_spec in node_spec["inputs"] if "defaultValue" in input_spec} if node_spec else {}
+        minified_node = {
+            "id": node_data["id"],
+            "type": node_data["type"]
+        }
+        parameters = {key: parameter for key, parameter in node_data["parameters"].items()
+                      if "value" not in parameter or key not in defaults or
+                      not is_default_value(parameter["value"], defaults[key])}
+        if parameters:
+            minified_node["parameters"] = parameters
+        if node_data["configuration"]:
+            minified_node["configuration"] = node_data["configuration"]
+        if node_data["flows"]:
+            minified_node["flows"] = node_data["flows"]
+        yield minified_node
+
+
+def minify_behavior(behavior, node_specs):
+    # The client fills in the nodespec default values of missing parameters, so literals that are equal to them
+    # and empty parameters, configuration and flows are left out.
+    behavior = dict(behavior)
+    behavior["nodes"] = minify_nodes(behavior["nodes"], node_specs)
+    if "templates" in behavior:
+        behavior["templates"] = [dict(template, nodes=list(minify_nodes(template["nodes"], node_specs)))
+                                 for template in behavior["templates"]]
+    return behavior
+
+
+def split_graph_instances(graph_instances, templates, instances):
+    # Groups the inline graph instances by graph and the template instances by template. Returns a list of
+    # (graph_instances, templates, instances) for each group with the template indices starting at 0.
+    parts = []
+    graph_parts = {}
+    for graph_instance in graph_instances:
+        part = graph_parts.get(graph_instance["graph"])
+        if part is None:
+            part = graph_parts[graph_instance["graph"]] = ([], [], [])
+            parts.append(part)
+        part[0].append(graph_instance)
+    for template_index, template in enumerate(templates):
+        template_instances = [dict(instance, template=0) for instance in instances
+                              if instance["template"] == template_index]
+        parts.append(([], [template], template_instances))
+    return parts
+
+
+def collect_ids(value, key, ids):
+    if type(value) is dict:
+        if type(value.get(key)) is int:
+            ids.add(value[key])
+        for item in value.values():
+            collect_ids(item, key, ids)
+    elif type(value) is list:
+        for item in value:
+            collect_ids(item, key, ids)
+
+
+def get_referenced_ids(graph_instances, templates, instances, key):
+    # Returns the ids referenced through the given configuration key by the nodes of a group of graphs
+    ids = set()
+    for graph_instance in graph_instances:
+        for node_data in graph_instance["nodes"]:
+            collect_ids(node_data["configuration"], key, ids)
+    for template in templates:
+        for node_data in template["nodes"]:
+            collect_ids(node_data["configuration"], key, ids)
+    for instance in instances:
+        for overrides in instance.get("overrides", {}).values():
+            collect_ids(overrides.get("configuration", {}), key, ids)
+    return ids
+
+
+def is_entity_link(value):
+    return type(value) is dict and value.get("__mhc_link_type") == "node"
+
+
+def index_entities(behavior):
+    # Entity links are replaced by {"entity": slot} where slot is an index into the "entities" table of the
+    # behavior, so every entity is written and resolved once. The table is filled while the nodes are streamed.
+    entities = []
+    slots = {}
+
+    def replace(value):
+        if is_entity_link(value):
+            entity_key = get_value_key(value)
+            if entity_key not in slots:
+                slots[entity_key] = len(entities)
+                entities.append(value)
+            return {ENTITY_KEY: slots[entity_key]}
+        elif type(value) is dict:
+            return {key: replace(item) for key, item in value.items()}
+        elif type(value) is list:
+            return [replace(item) for item in value]
+        return value
+
+    behavior = dict(behavior)
+    for key in ["customEvents", "variables", "templates", "instances", "eventDispatch"]:
+        if key in behavior:
+            behavior[key] = replace(behavior[key])
+    behavior["nodes"] = (replace(node_data) for node_data in behavior["nodes"])
+    behavior["entities"] = entities
+    return behavior
+
+
+# Keys that reference the behavior variables and custom events by their export wide id
+CONTENT_ID_KEYS = {
+    "variableId": "variables",
+    "customEventId": "customEvents"
+}
+
+
+def replace_content_ids(value, id_maps):
+    if type(value) is dict:
+        return {key: id_maps[key].get(item, item) if key in id_maps and type(item) is int
+                else replace_content_ids(item, id_maps) for key, item in value.items()}
+    elif type(value) is list:
+        return [replace_content_ids(item, id_maps) for item in value]
+    return value
+
+
+def get_canonical_behavior(behavior):
+    # The behavior without its debug names and with the variable and custom event ids replaced by their position
+    # in the behavior, so it doesn't change when variables or events are added to other graphs.
+    id_maps = {key: {item["id"]: idx for idx, item in enumerate(behavior.get(section, []))}
+               for key, section in CONTENT_ID_KEYS.items()}
+    behavior = replace_content_ids({key: value for key, value in behavior.items() if key != "debugNames"}, id_maps)
+    for section in CONTENT_ID_KEYS.values():
+        if section in behavior:
+            behavior[section] = [dict(item, id=idx) for idx, item in enumerate(behavior[section])]
+    return behavior
@@ -0,0 +1,148 @@
+import bpy
+from .utils import gather_object_property
+
+# Graphs that are used by several owners are exported once as a template. Every owner that uses the graph
+# gets an entry in the instances table with the prefix of its node ids, its "self" entity and the parameters
+# and configuration that differ from the template. References to the owner entity are replaced in the template
+# by a {"self": true} value that the client resolves to the instance "self" entity.
+
+SELF_ENTITY_KEY = "self"
+
+
+def is_node_link(value, gltf_node):
+    return type(value) is dict and value.get("__mhc_link_type") == "node" and value.get("index") is gltf_node
+
+
+def replace_self_entity(value, gltf_node):
+    if gltf_node is None:
+        return value
+    if is_node_link(value, gltf_node):
+        return {SELF_ENTITY_KEY: True}
+    elif type(value) is dict:
+        return {key: replace_self_entity(item, gltf_node) for key, item in value.items()}
+    elif type(value) is list:
+        return [replace_self_entity(item, gltf_node) for item in value]
+    return value
+
+
+def strip_id_prefix(node_id, prefix):
+    return node_id[len(prefix) + 1:]
+
+
+def make_template_node(node_data, prefix, gltf_node):
+    template_node = {
+        "id": strip_id_prefix(node_data["id"], prefix),
+        "type": node_data["type"],
+        "parameters": {},
+        "configuration": replace_self_entity(node_data["configuration"], gltf_node),
+        "flows": {}
+    }
+    for key, parameter in node_data["parameters"].items():
+        if "link" in parameter:
+            parameter = {
+                "link": {
+                    "nodeId": strip_id_prefix(parameter["link"]["nodeId"], prefix),
+                    "socket": parameter["link"]["socket"]
+                }
+            }
+        template_node["parameters"][key] = replace_self_entity(parameter, gltf_node)
+    for key, flow in node_data["flows"].items():
+        template_node["flows"][key] = {
+            "nodeId": strip_id_prefix(flow["nodeId"], prefix),
+            "socket": flow["socket"]
+        }
+    return template_node
+
+
+def diff_template_node(template_node, node):
+    # Returns the instance overrides for a node or None if the node can't be expressed as a template node
+    if template_node["type"] != node["type"] or template_node["flows"] != node["flows"]:
+        return None
+    overrides = {}
+    for section in ["parameters", "configuration"]:
+        template_values = template_node[section]
+        values = node[section]
+        changes = {}
+        for key in list(template_values.keys()) + [key for key in values.keys() if key not in template_values]:
+            if key not in values:
+                changes[key] = None
+            elif key not in template_values or template_values[key] != values[key]:
+                changes[key] = values[key]
+        if changes:
+            overrides[section] = changes
+    return overrides
+
+
+def gather_self_entity(owner, export_settings):
+    if type(owner) is not bpy.types.Object:
+        return None
+    return gather_object_property(export_settings, owner)
+
+
+def diff_instance(template, instance_nodes):
+    # Returns the overrides of all the instance nodes keyed by node id or None if the instance doesn't match
+    if len(template["nodes"]) != len(instance_nodes):
+        return None
+    template_nodes = {template_node["id"]: template_node for template_node in template["nodes"]}
+    overrides = {}
+    for node in instance_nodes:
+        template_node = template_nodes.get(node["id"])
+        if template_node is None:
+            return None
+        node_overrides = diff_template_node(template_node, node)
+        if node_overrides is None:
+            return None
+        if node_overrides:
+            overrides[node["id"]] = node_overrides
+    return overrides
+
+
+def extract_graph_templates(graph_instances, export_settings):
+    # graph_instances is a list of {"owner", "graph", "prefix", "nodes"} in gathering order.
+    # Returns the graph instances that are still exported inline, the templates and the instances table.
+    instance_count = {}
+    for graph_instance in graph_instances:
+        instance_count[graph_instance["graph"]] = instance_count.get(graph_instance["graph"], 0) + 1
+
+    inline_instances = []
+    templates = []
+    instances = []
+    graph_templates = {}
+    for graph_instance in graph_instances:
+        graph = graph_instance["graph"]
+        if instance_count[graph] < 2 or not graph_instance["nodes"]:
+            inline_instances.append(graph_instance)
+            continue
+
+        prefix = graph_instance["prefix"]
+        self_entity = gather_self_entity(graph_instance["owner"], export_settings)
+        gltf_node = self_entity["index"] if self_entity else None
+        instance_nodes = [make_template_node(node_data, prefix, gltf_node) for node_data in graph_instance["nodes"]]
+
+        template_index = graph_templates.get(graph)
+        if template_index is None:
+            template_index = len(templates)
+            graph_templates[graph] = template_index
+            templates.append({
+                "name": graph.name,
+                "nodes": instance_nodes
+            })
+            overrides = {}
+        else:
+            overrides = diff_instance(templates[template_index], instance_nodes)
+            if overrides is None:
+                # The graph nodes gathered differently for this owner (ie. a node failed to export)
+                inline_instances.append(graph_instance)
+                continue
+
+        instance = {
+            "template": template_index,
+            "idPrefix": prefix
+        }
+        if self_entity:
+            instance["self"] = self_entity
+        if overrides:
+            instance["overrides"] = overrides
+        instances.append(instance)
+
+    return (inline_instances, templates, instances)
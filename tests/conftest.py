@@ -0,0 +1,15 @@
+import os
+import sys
+import types
+
+# The export passes don't use bpy, they are imported from an alias of the add-on package so the add-on
+# __init__ (which registers the Blender classes) doesn't run. pytest imports the repository root as a package
+# too (it has an __init__.py), the alias is registered under that name as well.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "bg_addon" not in sys.modules:
+    package = types.ModuleType("bg_addon")
+    package.__file__ = os.path.join(ROOT, "__init__.py")
+    package.__path__ = [ROOT]
+    sys.modules["bg_addon"] = package
+    sys.modules.setdefault(os.path.basename(ROOT), package)
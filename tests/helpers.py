@@ -0,0 +1,24 @@
+def node(node_id, node_type, parameters=None, flows=None, configuration=None):
+    return {
+        "id": node_id,
+        "type": node_type,
+        "parameters": parameters or {},
+        "configuration": configuration or {},
+        "flows": flows or {}
+    }
+
+
+def value(v):
+    return {"value": v}
+
+
+def link(node_id, socket="result"):
+    return {"link": {"nodeId": node_id, "socket": socket}}
+
+
+def flow(node_id, socket="flow"):
+    return {"nodeId": node_id, "socket": socket}
+
+
+def ids(nodes):
+    return [node_data["id"] for node_data in nodes]
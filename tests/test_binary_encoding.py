@@ -0,0 +1,89 @@
+import json
+
+from bg_addon.binary_encoding import encode_behavior, decode_behavior, MAX_SAFE_INTEGER
+from helpers import node
+
+
+def get_nodes(ids):
+    a, b, c, d = ids
+    return [
+        node(a, "lifecycle/onStart", flows={"flow": {"nodeId": b, "socket": "flow"}}),
+        node(b, "debug/log", {
+            "text": {"value": "hello"},
+            "count": {"value": 3},
+            "big": {"value": MAX_SAFE_INTEGER + 1},
+            "negative": {"value": -MAX_SAFE_INTEGER - 1},
+            "flag": {"value": True},
+            "amount": {"value": 0.25},
+            "position": {"value": {"x": 1.0, "y": -2.5, "z": 0.0}},
+            "entity": {"value": {"__mhc_link_type": "node", "index": 4}},
+            "sum": {"link": {"nodeId": c, "socket": "result"}}
+        }, flows={"flow": {"nodeId": d, "socket": "flow"}}),
+        node(c, "math/add/float", {"a": {"value": 1.0}, "b": {"link": {"nodeId": "missing", "socket": "result"}}}),
+        node(d, "customEvent/trigger", flows={"flow": {"nodeId": "elsewhere", "socket": "flow"}},
+             configuration={"customEventId": 2})
+    ]
+
+
+def round_trip(behavior, node_ids):
+    encoded, data = encode_behavior(behavior, node_ids)
+    assert len(data) % 4 == 0
+    # The header has to be valid JSON
+    encoded = json.loads(json.dumps(encoded))
+    return encoded, decode_behavior(encoded, data)
+
+
+def test_round_trip_compact_ids():
+    nodes = get_nodes([0, 1, 2, 3])
+    behavior = {"variables": [], "customEvents": [], "nodes": nodes}
+    encoded, decoded = round_trip(behavior, [0, 1, 2, 3])
+    assert "nodeIds" not in encoded["nodeTable"]
+    assert "nodes" not in encoded
+    assert decoded == behavior
+
+
+def test_round_trip_named_ids():
+    nodes = get_nodes(["start", "log", "add", "trigger"])
+    behavior = {"nodes": nodes}
+    encoded, decoded = round_trip(behavior, ["start", "log", "add", "trigger"])
+    assert encoded["nodeTable"]["nodeIds"] == ["start", "log", "add", "trigger"]
+    assert decoded == behavior
+
+
+def test_irregular_values_stay_in_the_header():
+    encoded, decoded = round_trip({"nodes": get_nodes([0, 1, 2, 3])}, [0, 1, 2, 3])
+    irregular = {extra["node"]: extra for extra in encoded["nodeTable"]["irregular"]}
+    assert set(irregular[1]["parameters"]) == {"text", "big", "negative", "entity"}
+    assert irregular[2]["parameters"] == {"b": {"link": {"nodeId": "missing", "socket": "result"}}}
+    assert irregular[3]["flows"] == {"flow": {"nodeId": "elsewhere", "socket": "flow"}}
+    assert irregular[3]["configuration"] == {"customEventId": 2}
+    assert encoded["nodeTable"]["numbers"] == 4
+    assert encoded["nodeTable"]["vectors"] == 1
+    big = decoded["nodes"][1]["parameters"]["big"]["value"]
+    assert big == MAX_SAFE_INTEGER + 1 and type(big) is int
+
+
+def test_round_trip_templates():
+    behavior = {
+        "nodes": get_nodes([0, 1, 2, 3]),
+        "templates": [
+            {"nodes": get_nodes([0, 1, 2, 3]), "parameters": ["1.text"]},
+            {"nodes": get_nodes(["a", "b", "c", "d"])}
+        ],
+        "instances": [{"template": 0, "values": ["hi"]}]
+    }
+    encoded, decoded = round_trip(behavior, [0, 1, 2, 3])
+    assert "nodeIds" not in encoded["templates"][0]["nodeTable"]
+    assert encoded["templates"][1]["nodeTable"]["nodeIds"] == ["a", "b", "c", "d"]
+    # Node tables share the buffer and the string table
+    offsets = [encoded["nodeTable"]["byteOffset"]] + [
+        template["nodeTable"]["byteOffset"] for template in encoded["templates"]]
+    assert offsets == sorted(set(offsets)) and all(offset % 8 == 0 for offset in offsets)
+    assert len(encoded["strings"]) == len(set(encoded["strings"]))
+    assert decoded == behavior
+
+
+def test_empty_behavior():
+    behavior = {"nodes": []}
+    encoded, decoded = round_trip(behavior, [])
+    assert decoded == behavior
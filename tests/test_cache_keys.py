@@ -0,0 +1,38 @@
+from bg_addon.cache_keys import get_entity_states
+
+
+def get_state_func(datablocks):
+    # datablocks maps id keys to (state, referenced id keys)
+    def get_state(id_key, refs):
+        state, referenced = datablocks[id_key]
+        refs.update(referenced)
+        return state
+    return get_state
+
+
+OWNER = ("OBJECT", "Owner", None)
+TARGET = ("OBJECT", "Target", None)
+MATERIAL = ("MATERIAL", "Red", None)
+OTHER_MATERIAL = ("MATERIAL", "Blue", None)
+
+
+def get_datablocks(target_material):
+    return {
+        # The owner variable default entity is the target of a Set Material node
+        OWNER: ({"variables": [{"name": "door", "defaultEntity": list(TARGET)}]}, {TARGET}),
+        TARGET: ({"materials": [list(target_material)]}, {target_material, OWNER}),
+        MATERIAL: ({"components": []}, set()),
+        OTHER_MATERIAL: ({"components": ["networked-material"]}, set())
+    }
+
+
+def test_nested_entities_are_included():
+    states = get_entity_states([OWNER], get_state_func(get_datablocks(MATERIAL)))
+    assert set(states) == {"OBJECT/Owner/None", "OBJECT/Target/None", "MATERIAL/Red/None"}
+
+
+def test_nested_entity_changes_the_state():
+    first = get_entity_states([OWNER], get_state_func(get_datablocks(MATERIAL)))
+    second = get_entity_states([OWNER], get_state_func(get_datablocks(OTHER_MATERIAL)))
+    assert first["OBJECT/Owner/None"] == second["OBJECT/Owner/None"]
+    assert first != second
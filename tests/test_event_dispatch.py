@@ -0,0 +1,31 @@
+from bg_addon.event_dispatch import get_event_dispatch, rename_event_dispatch
+from helpers import node, flow
+
+EVENT_TYPES = {"lifecycle/onStart", "hubs/onInteract", "customEvent/onTriggered"}
+
+
+def test_event_dispatch_groups_listeners():
+    door = {"__mhc_link_type": "node", "index": object()}
+    lamp = {"__mhc_link_type": "node", "index": object()}
+    nodes = [
+        node("a", "lifecycle/onStart", flows={"flow": flow("l")}),
+        node("b", "hubs/onInteract", configuration={"target": door}),
+        node("c", "hubs/onInteract", configuration={"target": lamp}),
+        node("d", "hubs/onInteract", configuration={"target": dict(door)}),
+        node("e", "customEvent/onTriggered", configuration={"customEventId": 1}),
+        node("f", "customEvent/onTriggered", configuration={"customEventId": 1, "parameters": []}),
+        node("g", "lifecycle/onStart"),
+        node("l", "debug/log")
+    ]
+    assert get_event_dispatch(nodes, EVENT_TYPES) == [
+        {"type": "lifecycle/onStart", "nodes": ["a", "g"]},
+        {"type": "hubs/onInteract", "target": door, "nodes": ["b", "d"]},
+        {"type": "hubs/onInteract", "target": lamp, "nodes": ["c"]},
+        {"type": "customEvent/onTriggered", "customEventId": 1, "nodes": ["e", "f"]}
+    ]
+
+
+def test_rename_event_dispatch():
+    table = get_event_dispatch([node("a", "lifecycle/onStart"), node("b", "lifecycle/onStart")], EVENT_TYPES)
+    assert rename_event_dispatch(table, {"a": 3, "b": 5}) == [{"type": "lifecycle/onStart", "nodes": [3, 5]}]
+    assert table == [{"type": "lifecycle/onStart", "nodes": ["a", "b"]}]
@@ -0,0 +1,217 @@
+from bg_addon.optimizations import (
+    js_round, fold_constants, merge_common_subexpressions, remove_redundant_casts, eliminate_dead_nodes)
+from bg_addon.execution_plan import get_execution_plan
+from bg_addon.network_analysis import get_network_decisions, disable_networking
+from helpers import node, value, link, flow, ids
+
+
+class FakeDep:
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+def test_js_round():
+    assert js_round(0.49999999999999994) == 0.0
+    assert js_round(0.5) == 1.0
+    assert js_round(2.5) == 3.0
+    assert js_round(-0.5) == 0.0
+    assert js_round(-1.5) == -1.0
+    assert js_round(-2.6) == -3.0
+
+
+def test_fold_constants():
+    nodes = [
+        node("a", "math/add/float", {"a": value(1.0), "b": value(2.0)}),
+        node("b", "math/multiply/float", {"a": link("a"), "b": value(3.0)}),
+        node("c", "debug/log", {"text": link("b")})
+    ]
+    result, folded = fold_constants(nodes, {})
+    assert ids(folded) == ["a", "b"]
+    assert result == [node("c", "debug/log", {"text": value(9.0)})]
+    # Inputs are not modified
+    assert nodes[2]["parameters"]["text"] == link("b")
+
+
+def test_fold_constants_keeps_invalid_results():
+    nodes = [
+        node("a", "math/divide/float", {"a": value(1.0), "b": value(0.0)}),
+        node("b", "math/sqrt/float", {"a": value(-1.0)}),
+        node("c", "math/add/float", {"a": link("a"), "b": link("b")})
+    ]
+    result, folded = fold_constants(nodes, {})
+    assert folded == []
+    assert result is nodes
+
+
+def test_fold_constants_uses_spec_defaults():
+    specs = {"math/add/float": {"inputs": [{"name": "a"}, {"name": "b", "defaultValue": 4.0}]}}
+    nodes = [
+        node("a", "math/add/float", {"a": value(1.0)}),
+        node("b", "debug/log", {"text": link("a")})
+    ]
+    result, folded = fold_constants(nodes, specs)
+    assert ids(folded) == ["a"]
+    assert result[0]["parameters"]["text"] == value(5.0)
+
+
+def test_merge_common_subexpressions():
+    nodes = [
+        node("a", "math/add/float", {"a": link("v"), "b": value(1.0)}),
+        node("b", "math/add/float", {"b": value(1.0), "a": link("v")}),
+        node("c", "math/add/float", {"a": link("v"), "b": value(2.0)}),
+        node("d", "math/negate/float", {"a": link("a")}),
+        node("e", "math/negate/float", {"a": link("b")}),
+        node("v", "variable/get", configuration={"variableId": 0}),
+        node("f", "debug/log", {"x": link("d"), "y": link("e"), "z": link("c")})
+    ]
+    pure = {"math/add/float", "math/negate/float"}
+    result, merged = merge_common_subexpressions(nodes, pure)
+    assert ids(merged) == ["b", "e"]
+    assert ids(result) == ["a", "c", "d", "v", "f"]
+    assert result[-1]["parameters"] == {"x": link("d"), "y": link("d"), "z": link("c")}
+
+
+def test_merge_common_subexpressions_skips_impure_nodes():
+    nodes = [
+        node("a", "math/random/float"),
+        node("b", "math/random/float"),
+        node("c", "debug/log", {"x": link("a"), "y": link("b")})
+    ]
+    result, merged = merge_common_subexpressions(nodes, {"math/add/float"})
+    assert merged == []
+    assert result is nodes
+
+
+def test_remove_redundant_casts():
+    nodes = [
+        node("v", "variable/get", configuration={"variableId": 0}),
+        node("a", "math/toVec3/float", {"x": link("v", "x"), "y": link("v", "y"), "z": link("v", "z")}),
+        node("b", "math/toFloat/vec3", {"a": link("a")}),
+        node("c", "math/toFloat/integer", {"a": value(3)}),
+        node("d", "debug/log", {"x": link("b", "y"), "y": link("c")})
+    ]
+    result, removed = remove_redundant_casts(nodes)
+    assert ids(removed) == ["a", "b", "c"]
+    assert ids(result) == ["v", "d"]
+    assert result[-1]["parameters"] == {"x": link("v", "y"), "y": value(3.0)}
+
+
+def test_remove_redundant_casts_keeps_lossy_round_trips():
+    nodes = [
+        node("v", "variable/get", configuration={"variableId": 0}),
+        node("a", "math/toInteger/float", {"a": link("v")}),
+        node("b", "math/toFloat/integer", {"a": link("a")}),
+        node("c", "debug/log", {"x": link("b")})
+    ]
+    result, removed = remove_redundant_casts(nodes)
+    assert removed == []
+    assert ids(result) == ["v", "a", "b", "c"]
+
+
+def test_eliminate_dead_nodes():
+    nodes = [
+        node("e", "lifecycle/onStart", flows={"flow": flow("b")}),
+        node("b", "debug/log", {"text": link("c")}),
+        node("c", "math/add/float", {"a": value(1.0), "b": value(2.0)}),
+        node("d", "debug/log", {"text": link("f")}),
+        node("f", "math/add/float", {"a": value(1.0), "b": value(2.0)})
+    ]
+    kept, removed = eliminate_dead_nodes(nodes, {"lifecycle/onStart"})
+    assert ids(kept) == ["e", "b", "c"]
+    assert ids(removed) == ["d", "f"]
+
+
+def test_eliminate_dead_nodes_skips_linked_flow_inputs():
+    # Linked flow inputs are also exported as parameter links, they don't make the source reachable
+    nodes = [
+        node("e", "lifecycle/onStart", flows={"flow": flow("b")}),
+        node("a", "debug/log", flows={"flow": flow("b")}),
+        node("b", "debug/log", {"flow": link("a", "flow")})
+    ]
+    nodes[2]["parameters"]["flow"] = link("e", "flow")
+    kept, removed = eliminate_dead_nodes(nodes, {"lifecycle/onStart"})
+    assert ids(kept) == ["e", "b"]
+    assert ids(removed) == ["a"]
+
+    nodes[2]["parameters"]["flow"] = link("a", "flow")
+    kept, removed = eliminate_dead_nodes(nodes, {"lifecycle/onStart"})
+    assert ids(kept) == ["e", "b"]
+    assert kept[1]["parameters"] == {}
+
+
+def test_execution_plan():
+    nodes = [
+        node("e", "lifecycle/onStart", flows={"flow": flow("l")}),
+        node("l", "debug/log", {"text": link("b"), "other": link("x")}),
+        node("a", "math/add/float", {"a": value(1.0), "b": value(2.0)}),
+        node("b", "math/multiply/float", {"a": link("a"), "b": link("a")}),
+        node("x", "math/add/float", {"a": link("y"), "b": value(1.0)}),
+        node("y", "math/add/float", {"a": link("x"), "b": value(1.0)}),
+        node("m", "debug/log", {"text": link("b")})
+    ]
+    data_types = {"math/add/float", "math/multiply/float"}
+    flow_types = {"lifecycle/onStart", "debug/log"}
+    plan, cyclic = get_execution_plan(nodes, data_types, flow_types)
+    assert cyclic == {"x", "y"}
+    # l reads from the cycle so it's left for the client
+    assert plan == [{"node": "m", "dependencies": ["a", "b"]}]
+
+
+def test_network_decisions():
+    nodes = [
+        node("s", "lifecycle/onStart", flows={"flow": flow("q")}),
+        node("q", "flow/sequence", flows={"1": flow("t"), "2": flow("d")}),
+        node("t", "hubs/entity/setVisible", {"visible": link("c")}),
+        node("c", "math/add/float", {"a": value(1.0), "b": value(2.0)}),
+        node("d", "time/delay", flows={"flow": flow("u")}),
+        node("u", "hubs/entity/setVisible", {"visible": value(True)}),
+        node("i", "hubs/onInteract", flows={"flow": flow("w")}),
+        node("w", "hubs/entity/setVisible", {"visible": value(True)}),
+        node("v", "variable/get", configuration={"variableId": 0}),
+        node("k", "hubs/entity/setVisible", {"visible": link("v")})
+    ]
+    nodes.append(node("s2", "lifecycle/onStart", flows={"flow": flow("k")}))
+    transform = FakeDep("networked-object-properties")
+    variables = FakeDep("networked-behavior")
+    plan = {
+        ("t", transform): {"value": None, "sources": ["t"]},
+        ("u", transform): {"value": None, "sources": ["u"]},
+        ("w", transform): {"value": None, "sources": ["w"]},
+        ("k", transform): {"value": None, "sources": ["k"]},
+        ("g", transform): {"value": None, "sources": [None]},
+        ("t", variables): {"value": None, "sources": ["t"]}
+    }
+    decisions = {target: (networked, reason) for target, dep, networked, reason in
+                 get_network_decisions(nodes, plan, {"math/add/float"})}
+    assert decisions["t"][0] is False
+    assert decisions["u"] == (True, "u runs from the flow output of d")
+    assert decisions["w"] == (True, "i doesn't run from lifecycle/onStart")
+    assert decisions["k"] == (True, "k has inputs that are not constant")
+    assert decisions["g"] == (True, "requested outside of a graph node")
+    assert len(decisions) == 5
+
+
+def test_network_decisions_skip_missing_targets():
+    # ie. a Set Material Property node without a material
+    nodes = [
+        node("s", "lifecycle/onStart", flows={"flow": flow("m")}),
+        node("m", "material/property/set", {"color": value("#ffffff")}, configuration={"networked": True})
+    ]
+    plan = {(None, FakeDep("networked-material")): {"value": None, "sources": ["m"]}}
+    assert get_network_decisions(nodes, plan, set()) == []
+
+
+def test_disable_networking():
+    nodes = [
+        node("a", "material/set", configuration={"networked": True}),
+        node("b", "material/set", configuration={"networked": True}),
+        node("c", "debug/log")
+    ]
+    result = disable_networking(nodes, {"a", "c"})
+    assert result[0]["configuration"] == {"networked": False}
+    assert result[1] is nodes[1]
+    assert result[2] is nodes[2]
+    assert nodes[0]["configuration"] == {"networked": True}
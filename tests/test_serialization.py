@@ -0,0 +1,178 @@
+from bg_addon.serialization import (
+    compact_node_ids, get_canonical_behavior, iter_graph_nodes, minify_behavior, is_default_value, index_entities,
+    split_graph_instances, get_referenced_ids)
+from helpers import node, value, link, flow
+
+
+def get_behavior(prefix, variable_id, event_id):
+    return {
+        "variables": [{"id": variable_id, "name": "score", "valueTypeName": "integer", "initialValue": 0}],
+        "customEvents": [{"id": event_id, "name": "hit", "parameters": []}],
+        "nodes": [
+            {"id": f"{prefix}_a", "type": "customEvent/onTriggered", "parameters": {},
+             "configuration": {"customEventId": event_id}, "flows": {"flow": {"nodeId": f"{prefix}_b", "socket": "flow"}}},
+            {"id": f"{prefix}_b", "type": "variable/set", "parameters": {"value": {"value": 1}},
+             "configuration": {"variableId": variable_id}, "flows": {}}
+        ],
+        "eventDispatch": [{"type": "customEvent/onTriggered", "customEventId": event_id, "nodes": [0]}]
+    }
+
+
+def compact(behavior):
+    return compact_node_ids(dict(behavior), True, [node_data["id"] for node_data in behavior["nodes"]])
+
+
+def test_canonical_behavior_ignores_prefixes_and_global_ids():
+    first = compact(get_behavior("Cube_0_Graph_0", 3, 7))
+    second = compact(get_behavior("Cube_5_Graph_0", 0, 1))
+    first["nodes"] = list(first["nodes"])
+    second["nodes"] = list(second["nodes"])
+    assert first["debugNames"] != second["debugNames"]
+    assert get_canonical_behavior(first) == get_canonical_behavior(second)
+
+
+def test_canonical_behavior_keeps_content_changes():
+    first = get_behavior("Cube", 3, 7)
+    second = get_behavior("Cube", 3, 7)
+    second["nodes"][1]["parameters"]["value"] = {"value": 2}
+    assert get_canonical_behavior(first) != get_canonical_behavior(second)
+
+
+def test_canonical_behavior_ids():
+    canonical = get_canonical_behavior(get_behavior("Cube", 3, 7))
+    assert canonical["variables"][0]["id"] == 0
+    assert canonical["customEvents"][0]["id"] == 0
+    assert canonical["nodes"][0]["configuration"] == {"customEventId": 0}
+    assert canonical["nodes"][1]["configuration"] == {"variableId": 0}
+    assert canonical["eventDispatch"][0]["customEventId"] == 0
+
+
+def test_iter_graph_nodes_releases_instances():
+    graph_instances = [{"nodes": [{"id": "a"}, {"id": "b"}]}, {"nodes": [{"id": "c"}]}]
+    nodes = iter_graph_nodes(graph_instances)
+    assert next(nodes) == {"id": "a"}
+    assert graph_instances[0]["nodes"] is None
+    assert graph_instances[1]["nodes"] == [{"id": "c"}]
+    assert list(nodes) == [{"id": "b"}, {"id": "c"}]
+    assert graph_instances[1]["nodes"] is None
+
+
+MINIFY_SPECS = {
+    "math/add/float": {"inputs": [{"name": "a", "defaultValue": 0.0}, {"name": "b", "defaultValue": 0.0}]},
+    "hubs/entity/setVisible": {"inputs": [{"name": "visible", "defaultValue": False},
+                                          {"name": "offset", "defaultValue": {"x": 0.0, "y": 0.0, "z": 0.0}}]}
+}
+
+
+def fill_defaults(node_data, node_specs):
+    # What the client does when it loads a minified node
+    parameters = {input_spec["name"]: value(input_spec["defaultValue"])
+                  for input_spec in node_specs.get(node_data["type"], {"inputs": []})["inputs"]
+                  if "defaultValue" in input_spec}
+    parameters.update(node_data.get("parameters", {}))
+    return node(node_data["id"], node_data["type"], parameters, node_data.get("flows"), node_data.get("configuration"))
+
+
+def test_is_default_value():
+    assert is_default_value(0.0, 0)
+    assert is_default_value({"x": 0.0, "y": 0.0, "z": 0.0}, {"x": 0, "y": 0, "z": 0})
+    assert not is_default_value(False, 0)
+    assert not is_default_value(1, True)
+    assert not is_default_value({"x": 0.0, "y": 0.0}, {"x": 0.0, "y": 0.0, "z": 0.0})
+    assert not is_default_value(None, None)
+
+
+def test_minify_drops_only_spec_defaults():
+    nodes = [
+        node("s", "lifecycle/onStart", flows={"flow": flow("v")}),
+        node("a", "math/add/float", {"a": value(0.0), "b": value(2.0)}),
+        node("v", "hubs/entity/setVisible", {
+            "visible": value(0),
+            "offset": value({"x": 0.0, "y": 0.0, "z": 0.0}),
+            "extra": value(0.0)
+        }),
+        node("w", "hubs/entity/setVisible", {"visible": link("a"), "offset": value({"x": 1.0, "y": 0.0, "z": 0.0})},
+             configuration={"networked": True})
+    ]
+    behavior = minify_behavior({"nodes": nodes}, MINIFY_SPECS)
+    minified = list(behavior["nodes"])
+    assert minified == [
+        {"id": "s", "type": "lifecycle/onStart", "flows": {"flow": flow("v")}},
+        {"id": "a", "type": "math/add/float", "parameters": {"b": value(2.0)}},
+        # An integer 0 is not the boolean default, inputs without a spec default are kept
+        {"id": "v", "type": "hubs/entity/setVisible", "parameters": {"visible": value(0), "extra": value(0.0)}},
+        {"id": "w", "type": "hubs/entity/setVisible", "configuration": {"networked": True},
+         "parameters": {"visible": link("a"), "offset": value({"x": 1.0, "y": 0.0, "z": 0.0})}}
+    ]
+    assert [fill_defaults(node_data, MINIFY_SPECS) for node_data in minified] == nodes
+
+
+def test_minify_templates():
+    template_nodes = [node("a", "math/add/float", {"a": value(0.0), "b": value(0.0)})]
+    behavior = minify_behavior({"nodes": [], "templates": [{"name": "graph", "nodes": template_nodes}]}, MINIFY_SPECS)
+    assert behavior["templates"] == [{"name": "graph", "nodes": [{"id": "a", "type": "math/add/float"}]}]
+    assert template_nodes[0]["parameters"] == {"a": value(0.0), "b": value(0.0)}
+
+
+def test_index_entities():
+    door_node = object()
+    door = {"__mhc_link_type": "node", "index": door_node}
+    lamp = {"__mhc_link_type": "node", "index": object()}
+    material = {"__mhc_link_type": "material", "index": object()}
+    nodes = [
+        node("a", "hubs/onInteract", configuration={"target": door}),
+        node("b", "hubs/entity/setVisible", {"entity": value(dict(door)), "other": value(lamp)}),
+        node("c", "material/set", {"material": value(material)})
+    ]
+    behavior = {
+        "variables": [{"id": 0, "name": "target", "initialValue": lamp}],
+        "eventDispatch": [{"type": "hubs/onInteract", "target": door, "nodes": ["a"]}],
+        "nodes": iter(nodes)
+    }
+    indexed = index_entities(behavior)
+    indexed_nodes = list(indexed["nodes"])
+    assert indexed["variables"][0]["initialValue"] == {"entity": 0}
+    assert indexed["eventDispatch"][0]["target"] == {"entity": 1}
+    assert indexed_nodes[0]["configuration"] == {"target": {"entity": 1}}
+    assert indexed_nodes[1]["parameters"] == {"entity": value({"entity": 1}), "other": value({"entity": 0})}
+    # Other glTF references are left as they are
+    assert indexed_nodes[2]["parameters"] == {"material": value(material)}
+    # The table is filled while the nodes are streamed
+    assert indexed["entities"] == [lamp, door]
+    assert indexed["entities"][1]["index"] is door_node
+    assert nodes[0]["configuration"]["target"] is door
+
+
+def test_split_graph_instances():
+    graph, other_graph = object(), object()
+    first = {"graph": graph, "nodes": [node("a", "variable/get", configuration={"variableId": 4})]}
+    second = {"graph": other_graph, "nodes": [node("b", "customEvent/trigger", configuration={"customEventId": 2})]}
+    third = {"graph": graph, "nodes": [node("c", "variable/set", configuration={"variableId": 5})]}
+    templates = [{"name": "t0", "nodes": []}, {"name": "t1", "nodes": [
+        node("d", "variable/get", configuration={"variableId": 1})]}]
+    instances = [
+        {"template": 1, "idPrefix": "x", "overrides": {"d": {"configuration": {"variableId": 7}}}},
+        {"template": 0, "idPrefix": "y"},
+        {"template": 1, "idPrefix": "z"}
+    ]
+    parts = split_graph_instances([first, second, third], templates, instances)
+    assert parts == [
+        ([first, third], [], []),
+        ([second], [], []),
+        ([], [templates[0]], [{"template": 0, "idPrefix": "y"}]),
+        ([], [templates[1]], [dict(instances[0], template=0), dict(instances[2], template=0)])
+    ]
+    assert get_referenced_ids(*parts[0], "variableId") == {4, 5}
+    assert get_referenced_ids(*parts[1], "customEventId") == {2}
+    assert get_referenced_ids(*parts[3], "variableId") == {1, 7}
+
+
+def test_split_parts_hash_the_same_wherever_they_are():
+    # The same graph exported in two files, with other graphs declaring variables before it in the second one
+    first = compact(get_behavior("Cube_0_Graph_0", 0, 0))
+    second = compact(get_behavior("Cube_3_Graph_0", 6, 2))
+    first["nodes"] = list(first["nodes"])
+    second["nodes"] = list(second["nodes"])
+    assert get_canonical_behavior(first) == get_canonical_behavior(second)
+    second["variables"][0]["initialValue"] = 1
+    assert get_canonical_behavior(first) != get_canonical_behavior(second)
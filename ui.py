@@ -604,6 +604,142 @@ class BGItem(PropertyGroup):
     graph: PointerProperty(type=NodeTree)
 
 
+class BGExportProperties(PropertyGroup):
+    use_graph_templates: BoolProperty(
+        name="Graph Templates",
+        description="Export graphs that are used by more than one owner once and reference them from a per owner instances table",
+        default=False)
+    export_profile: EnumProperty(
+        name="Profile",
+        description="Output profile",
+        items=[("DEFAULT", "Default", "Write every parameter, configuration and flows entry"),
+               ("MINIFIED", "Minified", "Leave out parameters equal to the nodespec defaults and empty configuration and flows")],
+        default="DEFAULT")
+    split_behaviors: BoolProperty(
+        name="Split Behaviors",
+        description="Export one behavior per graph or template, each with a content hash that clients can use to compile and cache it separately. Node ids are always compacted",
+        default=False)
+    compact_node_ids: BoolProperty(
+        name="Compact Node IDs",
+        description="Export node ids and links as node indices instead of names",
+        default=False)
+    keep_debug_names: BoolProperty(
+        name="Debug Names",
+        description="Keep the original node names in a debugNames section when exporting compact node ids",
+        default=False)
+    use_binary_encoding: BoolProperty(
+        name="Binary Encoding",
+        description="Store node types, links and numeric literals as typed arrays in a glTF buffer view",
+        default=False)
+    export_execution_plan: BoolProperty(
+        name="Execution Plan",
+        description="Export the data nodes every flow node reads from in evaluation order so the client doesn't need to sort them when loading",
+        default=False)
+    export_event_dispatch: BoolProperty(
+        name="Event Dispatch Table",
+        description="Export a table from event type and target entity to the event nodes so the client can register listeners without scanning the nodes",
+        default=False)
+    use_entity_table: BoolProperty(
+        name="Entity Table",
+        description="Write every referenced entity once to an entities table and reference it by its index",
+        default=False)
+    use_export_cache: BoolProperty(
+        name="Incremental Export",
+        description="Reuse the graphs gathered in the previous export when neither the graph nor its owner and referenced entities have changed",
+        default=False)
+    use_disk_cache: BoolProperty(
+        name="Disk Cache",
+        description="Store the gathered graphs in a cache directory so unchanged graphs are not gathered again, even in a new session",
+        default=False)
+    export_cache_dir: StringProperty(
+        name="Cache Directory",
+        description="Directory for the behavior graphs export cache. Defaults to a .bg_cache directory next to the blend file",
+        subtype='DIR_PATH',
+        default="")
+    remove_unreachable_nodes: BoolProperty(
+        name="Remove Unreachable Nodes",
+        description="Don't export nodes that can't be reached from an event node through flows or data links",
+        default=False)
+    fold_constants: BoolProperty(
+        name="Fold Constants",
+        description="Evaluate math nodes that only have literal inputs at export and replace their outputs with the resulting values",
+        default=False)
+    remove_redundant_casts: BoolProperty(
+        name="Remove Redundant Casts",
+        description="Skip conversions that don't change the value (identity and round trip casts) and convert literals at export",
+        default=False)
+    merge_duplicate_nodes: BoolProperty(
+        name="Merge Duplicate Nodes",
+        description="Export pure nodes that have the same type, configuration and inputs only once",
+        default=False)
+    minimize_networking: BoolProperty(
+        name="Minimize Networking",
+        description="Don't network entities and materials that are only changed from lifecycle/onStart with constant inputs, which gives the same state on every client",
+        default=False)
+    remove_unused_variables: BoolProperty(
+        name="Remove Unused Variables",
+        description="Don't export variables and custom events that no exported node references",
+        default=False)
+
+
+def draw_export_options(layout, props):
+    layout.prop(props, "export_profile")
+    layout.prop(props, "use_graph_templates")
+    layout.prop(props, "split_behaviors")
+    row = layout.row()
+    row.enabled = not props.split_behaviors
+    row.prop(props, "compact_node_ids")
+    row = layout.row()
+    row.enabled = props.compact_node_ids or props.split_behaviors
+    row.prop(props, "keep_debug_names")
+    layout.prop(props, "use_binary_encoding")
+    layout.prop(props, "export_execution_plan")
+    layout.prop(props, "export_event_dispatch")
+    layout.prop(props, "use_entity_table")
+    layout.prop(props, "use_export_cache")
+    layout.prop(props, "use_disk_cache")
+    row = layout.row()
+    row.enabled = props.use_disk_cache
+    row.prop(props, "export_cache_dir")
+    layout.separator()
+    layout.label(text="Optimizations")
+    layout.prop(props, "fold_constants")
+    layout.prop(props, "remove_redundant_casts")
+    layout.prop(props, "merge_duplicate_nodes")
+    layout.prop(props, "remove_unreachable_nodes")
+    layout.prop(props, "remove_unused_variables")
+    layout.prop(props, "minimize_networking")
+
+
+class BG_PT_ExportPanel(bpy.types.Panel):
+    bl_space_type = 'FILE_BROWSER'
+    bl_region_type = 'TOOL_PROPS'
+    bl_label = "Behavior Graphs"
+    bl_parent_id = "GLTF_PT_export_user_extensions"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        operator = context.space_data.active_operator
+        return operator.bl_idname == "EXPORT_SCENE_OT_gltf"
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        layout.use_property_decorate = False
+        draw_export_options(layout, context.scene.bg_export_props)
+
+
+# Blender 4.2+ glTF exporter draws the user extension options through the add-on draw_export function
+def draw_export(context, layout):
+    header, body = layout.panel("GLTF_addon_behavior_graphs_exporter", default_closed=True)
+    header.label(text="Behavior Graphs")
+    if body is not None:
+        body.use_property_split = True
+        body.use_property_decorate = False
+        draw_export_options(body, context.scene.bg_export_props)
+
+
 class BGPreferences(AddonPreferences):
     bl_idname = __package__
 
@@ -646,6 +782,9 @@ def register():
     bpy.utils.register_class(BG_PT_GraphPanel)
     bpy.utils.register_class(BGSetNetworkGraph)
     bpy.utils.register_class(BGUpdateNodeColors)
+    bpy.utils.register_class(BGExportProperties)
+    if bpy.app.version < (4, 2, 0):
+        bpy.utils.register_class(BG_PT_ExportPanel)
 
     bpy.utils.register_class(BGItem)
     bpy.types.Object.bg_slots = CollectionProperty(type=BGItem)
@@ -700,6 +839,8 @@ def register():
         description="Active Custom Event index",
         default=-1)
 
+    bpy.types.Scene.bg_export_props = PointerProperty(type=BGExportProperties)
+
     bpy.types.NODE_HT_header.draw = draw_header
 
 
@@ -725,6 +866,8 @@ def unregister():
     bpy.utils.unregister_class(BGSetNetworkGraph)
     bpy.utils.unregister_class(BGUpdateNodeColors)
     bpy.utils.unregister_class(BGPreferences)
+    if bpy.app.version < (4, 2, 0):
+        bpy.utils.unregister_class(BG_PT_ExportPanel)
 
     del bpy.types.Object.bg_slots
     del bpy.types.Object.bg_active_graph
@@ -745,6 +888,8 @@ def unregister():
     del bpy.types.NodeTree.bg_active_global_variable_idx
     del bpy.types.NodeTree.bg_custom_events
     del bpy.types.NodeTree.bg_active_custom_event_idx
+    del bpy.types.Scene.bg_export_props
     bpy.utils.unregister_class(BGItem)
+    bpy.utils.unregister_class(BGExportProperties)
 
     bpy.types.NODE_HT_header.draw = original_NODE_HT_header_draw
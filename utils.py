@@ -1,5 +1,7 @@
+import base64
 import bpy
 from bpy.types import NodeSocket
+from contextlib import contextmanager
 from io_hubs_addon.components.components_registry import (
     __components_registry,
     register_component,
@@ -37,18 +39,33 @@ def redraw_area(context, area_id):
                 context.window_manager.update_tag()
 
 
-def gather_material_property(export_settings, blender_object, target, property_name):
-    blender_material = getattr(target, property_name)
-    if blender_material:
+def register_gltf_source(export_settings, gltf_object, datablock):
+    # glTF object -> Blender datablock it was gathered from, used to cache payloads across exports
+    export_settings.setdefault('bg_gltf_sources', {})[gltf_object] = datablock
+
+
+def gather_cached_material(blender_material, export_settings):
+    # Materials referenced by sockets, variables and material nodes are gathered once per export
+    material_cache = export_settings.setdefault('bg_material_cache', {})
+    material = material_cache.get(blender_material)
+    if material is None:
         if bpy.app.version < (4, 0, 0):
             material = gltf2_blender_gather_materials.gather_material(
                 blender_material, 0, export_settings)
         else:
             material = gltf2_blender_gather_materials.gather_material(
                 blender_material, export_settings)[0]
+        material_cache[blender_material] = material
+        register_gltf_source(export_settings, material, blender_material)
+    return material
+
+
+def gather_material_property(export_settings, blender_object, target, property_name):
+    blender_material = getattr(target, property_name)
+    if blender_material:
         return {
             "__mhc_link_type": "material",
-            "index": material
+            "index": gather_cached_material(blender_material, export_settings)
         }
     else:
         return None
@@ -92,21 +109,35 @@ def __gather_wrap(blender_shader_node, export_settings):
     return wrap_s, wrap_t
 
 
-def gather_texture_property(export_settings, blender_object, target, property_name):
-    blender_texture = getattr(target, property_name)
-
+def gather_cached_texture(blender_texture, export_settings):
+    # The glTF exporter dedupes samplers and textures by instance so we hand out the same objects for
+    # textures that share an image and sampler parameters instead of creating new ones for every reference.
     wrap_s, wrap_t = __gather_wrap(blender_texture, export_settings)
-    sampler = gltf2_io.Sampler(
-        extensions=None,
-        extras=None,
-        mag_filter=__gather_mag_filter(blender_texture, export_settings),
-        min_filter=__gather_min_filter(blender_texture, export_settings),
-        name=None,
-        wrap_s=wrap_s,
-        wrap_t=wrap_t,
+    sampler_key = (
+        __gather_mag_filter(blender_texture, export_settings),
+        __gather_min_filter(blender_texture, export_settings),
+        wrap_s,
+        wrap_t
     )
+    sampler_cache = export_settings.setdefault('bg_sampler_cache', {})
+    sampler = sampler_cache.get(sampler_key)
+    if sampler is None:
+        mag_filter, min_filter, wrap_s, wrap_t = sampler_key
+        sampler = gltf2_io.Sampler(
+            extensions=None,
+            extras=None,
+            mag_filter=mag_filter,
+            min_filter=min_filter,
+            name=None,
+            wrap_s=wrap_s,
+            wrap_t=wrap_t,
+        )
+        sampler_cache[sampler_key] = sampler
 
-    if blender_texture:
+    texture_key = (blender_texture.image, sampler_key)
+    texture_cache = export_settings.setdefault('bg_texture_cache', {})
+    texture = texture_cache.get(texture_key)
+    if texture is None:
         texture = gltf2_io.Texture(
             extensions=None,
             extras=None,
@@ -114,14 +145,50 @@ def gather_texture_property(export_settings, blender_object, target, property_na
             sampler=sampler,
             source=gather_image(blender_texture.image, export_settings)
         )
+        texture_cache[texture_key] = texture
+        register_gltf_source(export_settings, texture, blender_texture)
+    return texture
+
+
+def gather_texture_property(export_settings, blender_object, target, property_name):
+    blender_texture = getattr(target, property_name)
+    if blender_texture:
         return {
             "__mhc_link_type": "texture",
-            "index": texture
+            "index": gather_cached_texture(blender_texture, export_settings)
         }
     else:
         return None
 
 
+def build_vnode_index(export_settings):
+    # Blender object -> vtree node uuid lookup for the current export. The vtree doesn't exist yet when the
+    # pre-export callbacks run so this is built when we start gathering and dropped in the post-export callback.
+    # Several vnodes can point to the same object (ie. collection instances), we keep the first one as that's
+    # what the old linear search returned.
+    vnode_index = {}
+    for uuid, vnode in export_settings['vtree'].nodes.items():
+        if vnode.blender_object is not None and vnode.blender_object not in vnode_index:
+            vnode_index[vnode.blender_object] = uuid
+    export_settings['bg_vnode_index'] = vnode_index
+    return vnode_index
+
+
+def get_vnode(export_settings, blender_object):
+    vnode_index = export_settings.get('bg_vnode_index')
+    if vnode_index is None:
+        vnode_index = build_vnode_index(export_settings)
+    uuid = vnode_index.get(blender_object)
+    if uuid is None:
+        raise Exception(f"Entity {blender_object.name} is not part of the export")
+    return export_settings['vtree'].nodes[uuid]
+
+
+def clear_export_caches(export_settings):
+    for key in [key for key in export_settings.keys() if key.startswith("bg_")]:
+        del export_settings[key]
+
+
 def gather_object_property(export_settings, blender_object):
     if blender_object:
         if bpy.app.version < (3, 2, 0):
@@ -133,13 +200,12 @@ def gather_object_property(export_settings, blender_object):
                 export_settings
             )
         else:
-            vtree = export_settings['vtree']
-            vnode = vtree.nodes[next((uuid for uuid in vtree.nodes if (
-                vtree.nodes[uuid].blender_object == blender_object)), None)]
+            vnode = get_vnode(export_settings, blender_object)
             node = vnode.node or gltf2_blender_gather_nodes.gather_node(
                 vnode,
                 export_settings
             )
+        register_gltf_source(export_settings, node, blender_object)
 
         return {
             "__mhc_link_type": "node",
@@ -186,33 +252,90 @@ def add_component_to_node(gltf2_object, dep, value, export_settings):
                 extensions[hubs_ext_name][dep.get_name()].update(value)
 
 
-def update_gltf_network_dependencies(node, export_settings, blender_object, dep, value={"networked": "true"}):
+def add_embedded_buffer_view(gltf2_object, data):
+    # The exporter has already written its own buffer when the glTF extensions are gathered, so the data is
+    # embedded in a separate buffer as a data URI. Returns the buffer view index.
+    if gltf2_object.buffers is None:
+        gltf2_object.buffers = []
+    if gltf2_object.buffer_views is None:
+        gltf2_object.buffer_views = []
+    gltf2_object.buffers.append(gltf2_io.Buffer(
+        byte_length=len(data),
+        extensions=None,
+        extras=None,
+        name=None,
+        uri="data:application/octet-stream;base64," + base64.b64encode(data).decode("ascii")
+    ))
+    gltf2_object.buffer_views.append(gltf2_io.BufferView(
+        buffer=len(gltf2_object.buffers) - 1,
+        byte_length=len(data),
+        byte_offset=0,
+        byte_stride=None,
+        extensions=None,
+        extras=None,
+        name=None,
+        target=None
+    ))
+    return len(gltf2_object.buffer_views) - 1
+
+
+def apply_gltf_network_dependency(export_settings, blender_object, dep, value):
     if type(blender_object) is bpy.types.Object:
-        vtree = export_settings['vtree']
-        vnode = vtree.nodes[next((uuid for uuid in vtree.nodes if (
-            vtree.nodes[uuid].blender_object == blender_object)), None)]
+        vnode = get_vnode(export_settings, blender_object)
         gltf_object = vnode.node or gltf2_blender_gather_nodes.gather_node(
             vnode,
             export_settings
         )
         add_component_to_node(gltf_object, dep, value, export_settings)
     elif type(blender_object) is bpy.types.Material:
-        if bpy.app.version < (4, 0, 0):
-            gltf_object = gltf2_blender_gather_materials.gather_material(
-                blender_object, 0, export_settings)
-        else:
-            gltf_object = gltf2_blender_gather_materials.gather_material(
-                blender_object,  export_settings)[0]
+        gltf_object = gather_cached_material(blender_object, export_settings)
         add_component_to_node(gltf_object, dep, value, export_settings)
 
 
+def update_gltf_network_dependencies(node, export_settings, blender_object, dep, value={"networked": "true"}):
+    # Nodes without a target (ie. no material set) don't add anything
+    if blender_object is None:
+        return
+    # Record the dependency so it can be applied again when the graph instance is reused from the export cache
+    # bg_network_source is the id of the exported node that requested the dependency
+    source = export_settings.get('bg_network_source')
+    network_log = export_settings.get('bg_network_log')
+    if network_log is not None:
+        network_log.append((blender_object, dep, dict(value), source))
+    # While the behavior graphs are exported the dependencies are merged per target and component and applied once
+    network_plan = export_settings.get('bg_network_plan')
+    if network_plan is not None:
+        entry = network_plan.setdefault((blender_object, dep), {"value": {}, "sources": []})
+        entry["value"].update(value)
+        entry["sources"].append(source)
+    else:
+        apply_gltf_network_dependency(export_settings, blender_object, dep, value)
+
+
+def begin_network_plan(export_settings):
+    export_settings['bg_network_plan'] = {}
+
+
+def apply_network_plan(export_settings, export_report, skipped=()):
+    network_plan = export_settings.pop('bg_network_plan', {})
+    for (blender_object, dep), entry in network_plan.items():
+        if (blender_object, dep) in skipped:
+            continue
+        try:
+            apply_gltf_network_dependency(export_settings, blender_object, dep, entry["value"])
+        except Exception as e:
+            export_report.append(f'ERROR: {blender_object.name}/{dep.get_name()}: {e}')
+
+
 def get_input_entity(node, context, ob=None):
+    if ob is None:
+        ob = get_export_owner()
     target = None
     entity_socket = node.inputs.get("entity")
     if entity_socket:
         target = entity_socket.target
-        if node.inputs.get("entity").is_linked and len(entity_socket.links) > 0:
-            link = entity_socket.links[0]
+        link = get_input_link(entity_socket)
+        if link:
             from_node = link.from_socket.node
             # This case should go away when we remove BGNode_variable_get
             if from_node.bl_idname == "BGNode_variable_get":
@@ -238,12 +361,9 @@ def get_input_entity(node, context, ob=None):
             elif entity_socket.entity_type == "scene":
                 target = context.scene
             elif entity_socket.entity_type == "graph":
-                # When exporting we use the current exporting object as the target object
+                # When exporting we use the graph that is being exported
                 if ob:
-                    if type(ob) is bpy.types.Object:
-                        target = context.active_object.bg_active_graph
-                    else:
-                        target = context.scene.bg_active_graph
+                    target = get_export_graph() or get_graph_from_node(node)
                 else:
                     if context.scene.bg_node_type == 'OBJECT':
                         target = context.active_object.bg_active_graph
@@ -293,8 +413,8 @@ def gather_socket_value(ob, export_settings, socket):
 
 
 def gather_deep_socket_value(socket, ob, export_settings, context):
-    if socket.is_linked and len(socket.links) > 0:
-        link = socket.links[0]
+    link = get_input_link(socket)
+    if link:
         from_node = link.from_socket.node
         # This case should go away when we remove BGNode_variable_get
         if from_node.bl_idname == "BGNode_variable_get":
@@ -353,16 +473,128 @@ def gather_variable_value(ob, var, export_settings):
     return value
 
 
+class LinkMap:
+    # Links of a graph with the reroute chains collapsed. For every socket of a non reroute node it holds the
+    # link that reaches the real upstream (for inputs) or downstream (for outputs) socket. As in Blender's
+    # socket.links[0] only the first link of each socket is followed.
+
+    __slots__ = ("input_links", "output_links", "link_count")
+
+    def __init__(self, graph):
+        self.link_count = len(graph.links)
+        first_input_links = {}
+        first_output_links = {}
+        for link in graph.links:
+            first_input_links.setdefault(link.to_socket, link)
+            first_output_links.setdefault(link.from_socket, link)
+
+        self.input_links = {}
+        for to_socket, link in first_input_links.items():
+            if isinstance(link.to_node, bpy.types.NodeReroute):
+                continue
+            while link and isinstance(link.from_node, bpy.types.NodeReroute):
+                link = first_input_links.get(link.from_node.inputs[0])
+            self.input_links[to_socket] = link
+
+        self.output_links = {}
+        for from_socket, link in first_output_links.items():
+            if isinstance(link.from_node, bpy.types.NodeReroute):
+                continue
+            while link and isinstance(link.to_node, bpy.types.NodeReroute):
+                link = first_output_links.get(link.to_node.outputs[0])
+            self.output_links[from_socket] = link
+
+
+# Only kept while exporting, when the graphs are not edited. Outside of exports a script can relink a socket
+# at any time and a cached link could point to a removed one, so links are resolved directly. They are also
+# dropped by BGTree.update, when a file is loaded and on undo/redo.
+__link_maps = {}
+__link_maps_enabled = False
+
+
+def begin_link_maps():
+    global __link_maps_enabled
+    __link_maps.clear()
+    __link_maps_enabled = True
+
+
+def end_link_maps():
+    global __link_maps_enabled
+    __link_maps.clear()
+    __link_maps_enabled = False
+
+
+def invalidate_link_maps(graph=None):
+    if graph is None:
+        __link_maps.clear()
+    else:
+        __link_maps.pop(graph, None)
+
+
+def get_link_map(graph):
+    link_map = __link_maps.get(graph)
+    # Links added or removed from a script since the map was built
+    if link_map is None or link_map.link_count != len(graph.links):
+        link_map = LinkMap(graph)
+        __link_maps[graph] = link_map
+    return link_map
+
+
+def find_input_link(socket):
+    link = socket.links[0]
+    while link and isinstance(link.from_node, bpy.types.NodeReroute):
+        links = link.from_node.inputs[0].links
+        link = links[0] if links else None
+    return link
+
+
+def find_output_link(socket):
+    link = socket.links[0]
+    while link and isinstance(link.to_node, bpy.types.NodeReroute):
+        links = link.to_node.outputs[0].links
+        link = links[0] if links else None
+    return link
+
+
+def get_input_link(socket):
+    if not socket.is_linked:
+        return None
+    if not __link_maps_enabled:
+        return find_input_link(socket)
+    graph = socket.id_data
+    link_map = get_link_map(graph)
+    if socket not in link_map.input_links:
+        # Links were added from a script and the graph hasn't been updated yet
+        invalidate_link_maps(graph)
+        link_map = get_link_map(graph)
+    return link_map.input_links.get(socket)
+
+
+def get_output_link(socket):
+    if not socket.is_linked:
+        return None
+    if not __link_maps_enabled:
+        return find_output_link(socket)
+    graph = socket.id_data
+    link_map = get_link_map(graph)
+    if socket not in link_map.output_links:
+        invalidate_link_maps(graph)
+        link_map = get_link_map(graph)
+    return link_map.output_links.get(socket)
+
+
 def resolve_input_link(input_socket: bpy.types.NodeSocket) -> bpy.types.NodeLink:
-    while isinstance(input_socket.links[0].from_node, bpy.types.NodeReroute):
-        input_socket = input_socket.links[0].from_node.inputs[0]
-    return input_socket.links[0]
+    link = get_input_link(input_socket)
+    if not link:
+        raise Exception(f"Input {input_socket.name} is linked to a reroute that is not connected")
+    return link
 
 
 def resolve_output_link(output_socket: bpy.types.NodeSocket) -> bpy.types.NodeLink:
-    while isinstance(output_socket.links[0].to_node, bpy.types.NodeReroute):
-        output_socket = output_socket.links[0].to_node.outputs[0]
-    return output_socket.links[0]
+    link = get_output_link(output_socket)
+    if not link:
+        raise Exception(f"Output {output_socket.name} is linked to a reroute that is not connected")
+    return link
 
 
 def filter_on_components(self, ob):
@@ -461,17 +693,54 @@ def createSocketForComponentProperty(target, component, property_name):
     return socket
 
 
+# Owner (object or scene) and graph that are currently being exported. Enum items and get callbacks are
+# called by Blender with just the context, so while exporting they read the owner from here instead of
+# relying on the active object and the scene node type. This way exporting doesn't need to change the
+# selection, the active object or any scene property.
+__export_state = {
+    "owner": None,
+    "graph": None
+}
+
+
+@contextmanager
+def exporting_owner(owner, graph):
+    previous_state = __export_state.copy()
+    __export_state["owner"] = owner
+    __export_state["graph"] = graph
+    try:
+        yield
+    finally:
+        __export_state.update(previous_state)
+
+
+def get_export_owner():
+    return __export_state["owner"]
+
+
+def get_export_graph():
+    return __export_state["graph"]
+
+
+def get_export_type():
+    owner = __export_state["owner"]
+    if owner is None:
+        return "none"
+    return "object" if type(owner) is bpy.types.Object else "scene"
+
+
 # This function is used by several node entity_type properties and
 # it returns different values based on the node type (custom_type) and the
 # object that it's attached to. We decide what type of object it's attached to by
 # checking context.scene.bg_node_type but when exporting we can't trust
 # context.scene.bg_node_type as that will point to the currently selected graph node type
 # not to the actual object that's being exported.
-# To workaround that we use context.scene.bg_export_type that will be set to
-# the object type that is currently being exported.
-# Quite a hack for so far I didn't find a better workaround.
+# When exporting the type of the owner being exported is used instead, callers can pass it explicitly
+# and otherwise it's taken from the owner set with exporting_owner.
 
-def filter_entity_type(target, context):
+def filter_entity_type(target, context, export_type=None):
+    if export_type is None:
+        export_type = get_export_type()
     if not hasattr(target, "node_type"):
         target = target.node
     is_var_event_node = target.bl_idname in ["BGNode_variable_get",
@@ -486,9 +755,9 @@ def filter_entity_type(target, context):
                  ("graph", "Graph", "Graph"),
                  ("other", "Other", "Other")]
 
-        # If bg_export_type is not None, it's export time
-        if context.scene.bg_export_type != "none":
-            if context.scene.bg_export_type != "scene":
+        # If export_type is not None, it's export time
+        if export_type != "none":
+            if export_type != "scene":
                 types.insert(0, ("object", "Self", "Self"))
 
         #  Execution time, bg_node_type will be set to the type of the current object
@@ -499,9 +768,9 @@ def filter_entity_type(target, context):
     else:
         types = [("other", "Other", "Other")]
 
-        # If bg_export_type is not None, it's export time
-        if context.scene.bg_export_type != "none":
-            if context.scene.bg_export_type != "scene":
+        # If export_type is not None, it's export time
+        if export_type != "none":
+            if export_type != "scene":
                 types.insert(0, ("self", "Self", "Self"))
 
         #  Execution time, bg_node_type will be set to the type of the current object